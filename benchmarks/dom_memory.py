@@ -0,0 +1,64 @@
+"""Measure the memory and the render time of a tdom tree of 100,000 nodes.
+
+The tree is a table of 20,000 rows of 5 nodes each. Run with::
+
+    python benchmarks/dom_memory.py
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent.parent / "tests" / "tdom"))
+
+from tdom import ELEMENT, FRAGMENT, html
+
+from tstrings import Template, t
+
+ROWS = 20_000
+
+
+def count(node) -> int:
+    if node["type"] not in (ELEMENT, FRAGMENT):
+        return 1
+    return 1 + sum(count(child) for child in node["children"])
+
+
+def best_time(function, repeat: int = 5) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    templates: list[Template] = []
+    for i in range(ROWS):
+        templates.append(t("<tr><td>{i}</td><td class={i}>{i}</td></tr>"))
+    html(templates[0])
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rows = [html(template) for template in templates]
+    assert rows
+    root = html(t("<table>{rows}</table>"))
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    nodes = count(root)
+    build = best_time(lambda: [html(template) for template in templates], repeat=1)
+    render = best_time(lambda: str(root))
+    print(f"nodes:          {nodes:,}")
+    print(f"bytes per node: {size / nodes:.0f}")
+    print(f"build:          {build * 1000:.0f} ms")
+    print(f"str():          {render * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
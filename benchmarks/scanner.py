@@ -0,0 +1,79 @@
+"""Compare the template scanner of `t()` with the regex it replaced.
+
+The scanner should scale linearly with the size of the template. The regex
+also does on regular templates, but goes quadratic when a template has many
+opening braces that are not followed by a closing one, as with escaped
+braces in a code sample.
+
+Run with::
+
+    python benchmarks/scanner.py
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from tstrings import _scan
+
+# The regex used by t() up to version 0.1.5.
+_INTERPOLATION_RE = re.compile(
+    r"""
+    \{
+        (?P<expression>.+?)
+        (?P<debug>=)?
+        (?P<conversion>![rsa])?
+        (?P<format_spec>:[^}]*)?
+    }
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+# Above this size, the regex takes too long on pathological templates.
+MAX_QUADRATIC_SIZE = 10_000
+
+
+def regex_scan(template_string: str) -> list[dict[str, str | None]]:
+    return [m.groupdict() for m in _INTERPOLATION_RE.finditer(template_string)]
+
+
+def html_template(size: int) -> str:
+    """Markup with a replacement field every 60 characters or so."""
+    chunk = '<li class="item">{item.name!r:>20} <b>{price:.2f}</b></li>\n'
+    return chunk * (size // len(chunk))
+
+
+def code_template(size: int) -> str:
+    """A single field, then escaped opening braces, as in a code sample."""
+    chunk = "while (true) {{ "
+    return "<pre>{title}\n" + chunk * (size // len(chunk))
+
+
+def measure(function, template_string: str) -> float:
+    timer = timeit.Timer(lambda: function(template_string))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+def main() -> None:
+    print(f"{'template':<10}{'size':>12}{'scanner (ms)':>16}{'regex (ms)':>16}")
+    for name, make_template in (("html", html_template), ("code", code_template)):
+        for size in SIZES:
+            template_string = make_template(size)
+            scanner = measure(_scan, template_string) * 1000
+            if name == "code" and size > MAX_QUADRATIC_SIZE:
+                regex = "-"
+            else:
+                regex = f"{measure(regex_scan, template_string) * 1000:.3f}"
+            print(f"{name:<10}{size:>12,}{scanner:>16.3f}{regex:>16}")
+
+
+if __name__ == "__main__":
+    main()
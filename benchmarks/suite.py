@@ -0,0 +1,332 @@
+"""Benchmarks of `t()`, of `Template` operations and of tdom rendering.
+
+Each benchmark times a single operation with `timeit`, so the suite runs
+offline, without any dependency. Run it, optionally saving the results as
+JSON, with::
+
+    python benchmarks/suite.py run [-k SUBSTRING] [-o results.json]
+
+and compare the results of two runs, e.g. before and after a change, with::
+
+    python benchmarks/suite.py compare before.json after.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import timeit
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent.parent / "tests" / "tdom"))
+
+import tdom
+
+import tstrings
+from tstrings import Template, t
+
+# Benchmark name -> setup function, returning the function to time.
+BENCHMARKS: dict[str, Callable[[], Callable[[], object]]] = {}
+
+# Changes of the median time below this ratio are reported as noise.
+THRESHOLD = 0.05
+
+
+def benchmark(name: str):
+    def register(setup: Callable[[], Callable[[], object]]):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def _function(source: str, **names: object) -> Callable[[], object]:
+    """Compile `lambda: <source>`, so that `t()` sees `names` as globals."""
+    namespace = {"t": t, **names}
+    return eval(f"lambda: {source}", namespace)
+
+
+def _t_with_fields(count: int) -> Callable[[], object]:
+    names = {f"v{i}": i for i in range(count)}
+    template_string = " ".join(f"<{{{name}}}>" for name in names) or "static"
+    return _function(f"t({template_string!r})", **names)
+
+
+for _count in (0, 1, 10, 100):
+    benchmark(f"t() {_count} interpolations")(
+        lambda count=_count: _t_with_fields(count)
+    )
+
+
+@benchmark("t() 3 local variables")
+def _():
+    def function() -> Template:
+        name, age, city = "Alice", 30, "Paris"
+        assert name and age and city
+        return t("{name} ({age}) from {city}")
+
+    return function
+
+
+@benchmark("t() 1 expression")
+def _():
+    return _function("t('{len(data) + 1}')", data=[1, 2, 3])
+
+
+@benchmark("t() uncached parse")
+def _():
+    function = _function(
+        "t('Hello {name!r:>10}, you are {age + 1} now')", name="Alice", age=30
+    )
+    return lambda: (tstrings.cache_clear(), function())
+
+
+@benchmark("t() debug specifier")
+def _():
+    return _function("t('{name=} {age = }')", name="Alice", age=30)
+
+
+@benchmark("t() conversions")
+def _():
+    return _function("t('{name!r} {name!s} {name!a}')", name="Alice")
+
+
+@benchmark("t() format specs")
+def _():
+    return _function(
+        "t('{price:>10.2f} {price:{width}.{precision}f}')",
+        price=3.14159,
+        width=10,
+        precision=2,
+    )
+
+
+@benchmark("t() multiline expression")
+def _():
+    template_string = """{
+        sum(
+            value * 2
+            for value in data
+        )
+    }"""
+    return _function(f"t({template_string!r})", data=[1, 2, 3])
+
+
+@benchmark("Template.__add__ chain of 10")
+def _():
+    name = "Alice"
+    templates = []
+    for _ in range(10):
+        templates.append(t("<p>{name}</p>"))
+
+    def add() -> Template:
+        result = t("")
+        for template in templates:
+            result = result + template
+        return result
+
+    assert name
+    return add
+
+
+@benchmark("Template.join of 10")
+def _():
+    name = "Alice"
+    templates = []
+    for _ in range(10):
+        templates.append(t("<p>{name}</p>"))
+    assert name
+    return lambda: Template.join(templates)
+
+
+@benchmark("Template.__iter__ 10 interpolations")
+def _():
+    template = _t_with_fields(10)()
+    return lambda: list(template)
+
+
+@benchmark("render_fstring() 3 fields")
+def _():
+    name, price, count = "tea", 2.5, 3
+    assert name and price and count
+    template = t("{name!r}: {count} at {price:.2f}")
+    return lambda: tstrings.render_fstring(template)
+
+
+@benchmark("f-string 3 fields (reference)")
+def _():
+    return _function(
+        "f'{name!r}: {count} at {price:.2f}'", name="tea", price=2.5, count=3
+    )
+
+
+def _page() -> Template:
+    title, user, items = "Benchmark", "Alice", ["one", "two", "three"]
+    assert title and user and items
+    return t(
+        """
+        <div class="page">
+            <h1 title={title}>{title}</h1>
+            <p>Hello <strong>{user}</strong>!</p>
+            <ul>{[tdom.html(t("<li>{item}</li>")) for item in items]}</ul>
+        </div>
+        """
+    )
+
+
+@benchmark("tdom.html first render")
+def _():
+    template = _page()
+
+    def render() -> object:
+        tdom.cache_clear()
+        return tdom.html(template)
+
+    return render
+
+
+@benchmark("tdom.html cached render")
+def _():
+    template = _page()
+    return lambda: tdom.html(template)
+
+
+@benchmark("tdom.html_string cached render")
+def _():
+    template = _page()
+    return lambda: tdom.html_string(template)
+
+
+@benchmark("tdom.html list of 10k components")
+def _():
+    def Item(name, children):
+        return tdom.html(t("<li class={name}>{children}</li>"))
+
+    items = []
+    for i in range(10_000):
+        items.append(t("<{Item} name={str(i)}>item<//>"))
+    assert Item
+
+    def render() -> object:
+        nodes = [tdom.html(item) for item in items]
+        assert nodes
+        return tdom.html(t("<ul>{nodes}</ul>"))
+
+    return render
+
+
+@benchmark("tdom.html 10k interpolated children")
+def _():
+    template = _function(f"t({'<ul>' + '{item}' * 10_000 + '</ul>'!r})", item="x")()
+    return lambda: tdom.html(template)
+
+
+@benchmark("str() of a DOM of 1000 rows")
+def _():
+    rows = []
+    for i in range(1000):
+        row = t("<tr><td>{i}</td><td class={i}>&lt;{i}&gt;</td></tr>")
+        rows.append(tdom.html(row))
+    node = tdom.html(t("<table>{rows}</table>"))
+    return lambda: str(node)
+
+
+@benchmark("str() of a table of 100k numbers")
+def _():
+    rows = []
+    for i in range(25_000):
+        row = t("<tr><td>{i}</td><td>{i / 7}</td><td>{-i}</td><td>{i * 1e3}</td></tr>")
+        rows.append(tdom.html(row))
+    node = tdom.html(t("<table>{rows}</table>"))
+    return lambda: str(node)
+
+
+def measure(function: Callable[[], object], repeat: int) -> dict[str, float]:
+    """Time `function`, returning statistics of the time per call in seconds."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    times = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "number": number,
+    }
+
+
+def _format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def run(args: argparse.Namespace) -> None:
+    results = {}
+    print(f"{'benchmark':<40}{'min':>12}{'median':>12}")
+    for name, setup in BENCHMARKS.items():
+        if args.k and args.k not in name:
+            continue
+        result = results[name] = measure(setup(), args.repeat)
+        print(
+            f"{name:<40}{_format_time(result['min']):>12}"
+            f"{_format_time(result['median']):>12}"
+        )
+
+    if args.output:
+        data = {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "benchmarks": results,
+        }
+        Path(args.output).write_text(json.dumps(data, indent=2) + "\n")
+
+
+def compare(args: argparse.Namespace) -> None:
+    before = json.loads(Path(args.before).read_text())
+    after = json.loads(Path(args.after).read_text())
+    print(f"before: Python {before['python']}, {before['date']}")
+    print(f"after:  Python {after['python']}, {after['date']}")
+    print()
+    print(f"{'benchmark':<40}{'before':>12}{'after':>12}{'change':>16}")
+    for name, result in after["benchmarks"].items():
+        if name not in before["benchmarks"]:
+            continue
+        old, new = before["benchmarks"][name]["median"], result["median"]
+        ratio = new / old
+        if abs(ratio - 1) < THRESHOLD:
+            change = "same"
+        elif ratio < 1:
+            change = f"{1 / ratio:.2f}x faster"
+        else:
+            change = f"{ratio:.2f}x slower"
+        print(f"{name:<40}{_format_time(old):>12}{_format_time(new):>12}{change:>16}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("-k", help="only run benchmarks containing this")
+    run_parser.add_argument("-o", "--output", help="save the results as JSON")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.set_defaults(function=run)
+
+    compare_parser = commands.add_parser("compare", help="compare two runs")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.set_defaults(function=compare)
+
+    args = parser.parse_args()
+    args.function(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,42 +2,45 @@
 
 from __future__ import annotations
 
+import ast
 import re
 import sys
+import textwrap
+from bisect import bisect_right
 from dataclasses import dataclass
+from functools import lru_cache
 from itertools import zip_longest
-from typing import TYPE_CHECKING, Literal, NoReturn, cast
+from keyword import iskeyword
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Literal, NoReturn, cast
 
 if TYPE_CHECKING:
-    from collections.abc import Iterator
+    from collections.abc import Callable, Iterable, Iterator, Mapping
+    from functools import _CacheInfo, _lru_cache_wrapper
+    from types import CodeType, FrameType
 
 __all__ = [
     "Interpolation",
     "Template",
+    "TemplateBuilder",
+    "cache_clear",
+    "cache_info",
+    "lazy_t",
+    "render_fstring",
+    "set_cache_size",
     "t",
 ]
 
-# Regex to find and parse an f-string-like interpolation.
-# It captures:
-# 1. The main expression.
-# 2. An optional debug specifier (=).
-# 3. An optional conversion specifier (!r, !s, or !a).
-# 4. An optional format specifier (:...).
-_INTERPOLATION_RE = re.compile(
-    r"""
-    \{
-        # The core expression, non-greedy
-        (?P<expression>.+?)
-        # Optional debug specifier
-        (?P<debug>=)?
-        # Optional conversion, one of !r, !s, or !a
-        (?P<conversion>![rsa])?
-        # Optional format spec, starting with a colon, non-greedy until }
-        (?P<format_spec>:[^}]*)?
-    }
-    """,
-    re.VERBOSE | re.DOTALL,
-)
+# Default number of distinct template strings whose parse is kept in memory.
+_DEFAULT_CACHE_SIZE = 1024
+
+# The code flag of functions, whose local variables are not in a dict (the
+# same as `inspect.CO_OPTIMIZED`, without importing `inspect`).
+_CO_OPTIMIZED = 0x0001
+
+# Called with the template string, the name of a phase of `t()` and its
+# duration in seconds, when enabled by `tstrings.stats.enable()`.
+_recorder: Callable[[str, str, float], None] | None = None
 
 if sys.version_info >= (3, 10):
     dataclass_extra_args = {"slots": True}
@@ -66,6 +69,47 @@ class Interpolation:
         return id(self)
 
 
+# Below this number of strings, hashing a tuple in C is faster than calling
+# the cached hash of a `_Shape`, a method written in Python.
+_SHAPE_MIN_LENGTH = 32
+
+
+class _Shape(tuple):  # type: ignore[type-arg]
+    """The strings of a long template, hashing them only once.
+
+    Only created by `_shape()`: `__hash__` can be called on every render, to
+    look up the caches keyed on the strings of templates.
+    """
+
+    _hash: int
+
+    def __new__(cls, strings: tuple[str, ...]) -> _Shape:
+        shape = super().__new__(cls, strings)
+        shape._hash = tuple.__hash__(shape)
+        return shape
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __reduce__(self) -> tuple[type[_Shape], tuple[tuple[str, ...]]]:
+        # Not the cached hash: the hash of a string differs between processes.
+        return (_Shape, (tuple(self),))
+
+
+def _make_shape(strings: tuple[str, ...]) -> tuple[str, ...]:
+    return _Shape(strings) if len(strings) >= _SHAPE_MIN_LENGTH else strings
+
+
+# The canonical tuple of each distinct tuple of strings seen recently, so that
+# templates with the same strings, from the same literal or concatenations of
+# the same templates, share the same tuple: caches keyed on `strings` (as
+# those of `render_fstring()` and tdom) then find them by identity, without
+# comparing them string by string.
+_shape: _lru_cache_wrapper[tuple[str, ...]] = lru_cache(maxsize=_DEFAULT_CACHE_SIZE)(
+    _make_shape
+)
+
+
 @dataclass(frozen=True, eq=False, **dataclass_extra_args)
 class Template:
     """Emulates the string.templatelib.Template class from PEP 750.
@@ -77,7 +121,8 @@ class Template:
     """
     A non-empty tuple of the string parts of the template,
     with N+1 items, where N is the number of interpolations
-    in the template.
+    in the template. Templates built by `t()`, `+` or `join()`
+    with equal strings share the same tuple.
     """
     interpolations: tuple[Interpolation, ...]
     """
@@ -112,10 +157,27 @@ class Template:
         *first, final = self.strings
         other_first, *other_rest = other.strings
         return self.__class__(
-            strings=(*first, final + other_first, *other_rest),
+            strings=_shape((*first, final + other_first, *other_rest)),
             interpolations=self.interpolations + other.interpolations,
         )
 
+    @classmethod
+    def join(cls, parts: Iterable[str | Interpolation | Template]) -> Template:
+        """Concatenate strings, interpolations and templates into a template.
+
+        Unlike a chain of `+`, this takes linear time in the number of parts:
+
+            >>> name = "world"
+            >>> template = Template.join(["<p>", t("Hello {name}"), "</p>"])
+            >>> template.strings
+            ('<p>Hello ', '</p>')
+        """
+        builder = TemplateBuilder()
+        for part in parts:
+            builder.append(part)
+        template = builder.build()
+        return cls(strings=template.strings, interpolations=template.interpolations)
+
     def __eq__(self, value: object) -> bool:
         """Template and Interpolation instances compare with object identity (is)."""
         return self is value
@@ -129,6 +191,595 @@ class Template:
         raise TypeError("Template instances cannot be converted to strings directly.")
 
 
+class TemplateBuilder:
+    """Assemble a template from many parts, in linear time.
+
+    Strings, interpolations and templates are appended in order, then
+    `build()` returns the template concatenating all of them, e.g.:
+
+        >>> builder = TemplateBuilder()
+        >>> for name in ["a", "b"]:
+        ...     builder.append(t("<li>{name}</li>"))
+        >>> builder.build().values
+        ('a', 'b')
+    """
+
+    def __init__(self) -> None:
+        self._strings: list[str] = []
+        self._interpolations: list[Interpolation] = []
+        # The parts of the string after the last interpolation.
+        self._pending: list[str] = []
+
+    def append(self, part: str | Interpolation | Template) -> None:
+        """Add a string, an interpolation or a template at the end."""
+        if isinstance(part, str):
+            self._pending.append(part)
+        elif isinstance(part, Interpolation):
+            self._add_interpolation(part)
+        elif isinstance(part, Template):
+            strings = part.strings
+            self._pending.append(strings[0])
+            for interp, string in zip(part.interpolations, strings[1:]):
+                self._add_interpolation(interp)
+                self._pending.append(string)
+        else:
+            raise TypeError(
+                "Expected a str, an Interpolation or a Template, got"
+                f" {type(part).__name__!r}"
+            )
+
+    def _add_interpolation(self, interp: Interpolation) -> None:
+        self._strings.append("".join(self._pending))
+        self._pending.clear()
+        self._interpolations.append(interp)
+
+    def build(self) -> Template:
+        """Return the template of all the parts appended so far."""
+        return Template(
+            strings=_shape((*self._strings, "".join(self._pending))),
+            interpolations=tuple(self._interpolations),
+        )
+
+
+@dataclass(frozen=True, **dataclass_extra_args)
+class _ParsedInterpolation:
+    """The static part of an interpolation, as found by the parser."""
+
+    expression: str
+    """The expression text, as exposed on `Interpolation.expression`."""
+    source: str
+    """The dedented expression text that is actually evaluated."""
+    conversion: Literal["a", "r", "s"] | None
+    format_spec: str
+    """The format spec, if it has no replacement fields, `""` otherwise."""
+    format_spec_parts: tuple[str | _ParsedInterpolation, ...] = ()
+    """
+    The static strings and replacement fields of a format spec with
+    replacement fields, e.g. `{value:{width}.2f}`, or an empty tuple.
+    """
+
+    def fields(self) -> Iterator[_ParsedInterpolation]:
+        """The expression itself, then those of its format spec."""
+        yield self
+        for part in self.format_spec_parts:
+            if not isinstance(part, str):
+                yield part
+
+
+@dataclass(frozen=True, **dataclass_extra_args)
+class _ParsedTemplate:
+    """The structural parse of a template string.
+
+    It only depends on the template string, so it can be cached and shared
+    between calls: only the expressions need to be evaluated on each call.
+    """
+
+    strings: tuple[str, ...]
+    interpolations: tuple[_ParsedInterpolation, ...]
+    fields: tuple[_ParsedInterpolation, ...]
+    """
+    All the expressions to evaluate, in order: those of the interpolations,
+    each one followed by those of its format spec, if any.
+    """
+    code: CodeType | None
+    """
+    A code object evaluating all the `fields` at once, as a tuple.
+    This is `None` if there are no interpolations.
+    """
+    line_starts: tuple[int, ...]
+    """The first line of each field in the source of `code`."""
+    names: tuple[str, ...] | None
+    """
+    The name of each field, if all of them are simple names, so that they
+    can be looked up directly instead of evaluating `code`.
+    """
+
+    def failed_interpolation(self, error: BaseException) -> _ParsedInterpolation:
+        """Find the interpolation whose evaluation raised `error`."""
+        tb = error.__traceback__
+        while tb is not None:
+            if tb.tb_frame.f_code is self.code:
+                index = bisect_right(self.line_starts, tb.tb_lineno) - 1
+                return self.fields[max(index, 0)]
+            tb = tb.tb_next
+        # Should not happen, but better blame the first one than crash.
+        return self.fields[0]
+
+    def evaluate(
+        self, globals: dict[str, Any], locals: Mapping[str, object]
+    ) -> Template:
+        """Evaluate the fields in the given scope, and build the template."""
+        if self.code is None:
+            return Template(strings=self.strings, interpolations=())
+        try:
+            values = eval(self.code, globals, locals)
+        except Exception as e:
+            # Re-raise with more context
+            interp = self.failed_interpolation(e)
+            msg = f"Failed to evaluate expression '{interp.expression}': {e}"
+            raise type(e)(msg) from e
+        return Template(strings=self.strings, interpolations=self.interpolate(values))
+
+    def interpolate(self, values: tuple[object, ...]) -> tuple[Interpolation, ...]:
+        """Build the interpolations from the values of the fields."""
+        if len(self.fields) == len(self.interpolations):
+            return tuple(
+                [
+                    Interpolation(
+                        value=value,
+                        expression=interp.expression,
+                        conversion=interp.conversion,
+                        format_spec=interp.format_spec,
+                    )
+                    for interp, value in zip(self.interpolations, values)
+                ]
+            )
+
+        # Some format specs have replacement fields.
+        interpolations = []
+        values_iter = iter(values)
+        for interp in self.interpolations:
+            value = next(values_iter)
+            format_spec = interp.format_spec
+            if interp.format_spec_parts:
+                format_spec = _format_spec(interp.format_spec_parts, values_iter)
+            interpolations.append(
+                Interpolation(
+                    value=value,
+                    expression=interp.expression,
+                    conversion=interp.conversion,
+                    format_spec=format_spec,
+                )
+            )
+        return tuple(interpolations)
+
+
+_CONVERTERS: dict[str | None, Callable[[object], object]] = {
+    None: lambda value: value,
+    "a": ascii,
+    "r": repr,
+    "s": str,
+}
+
+
+def _format_spec(
+    parts: tuple[str | _ParsedInterpolation, ...], values: Iterator[object]
+) -> str:
+    """Build a format spec from its parts, taking field values from `values`."""
+    return "".join(
+        [
+            part
+            if isinstance(part, str)
+            else format(_CONVERTERS[part.conversion](next(values)), part.format_spec)
+            for part in parts
+        ]
+    )
+
+
+def _code_filename(template_string: str) -> str:
+    """A pseudo file name identifying a template in tracebacks."""
+    if len(template_string) > 40:
+        template_string = template_string[:37] + "..."
+    return f"<t-string {template_string!r}>"
+
+
+def _parse_expression(source: str) -> ast.expr:
+    """Parse a single expression, as a replacement field of an f-string."""
+    return ast.parse(source.strip(), "<string>", "eval").body
+
+
+def _compile(
+    template_string: str, fields: tuple[_ParsedInterpolation, ...]
+) -> tuple[CodeType | None, tuple[int, ...]]:
+    """Compile all the expressions of a template into a single code object.
+
+    The code evaluates to a tuple of the values of the expressions. Each
+    expression is parsed on its own, then they are shifted to lines of their
+    own, so that a traceback line number tells which expression failed.
+    """
+    if not fields:
+        return None, ()
+
+    expressions = []
+    line_starts = []
+    line = 1
+    for interp in fields:
+        try:
+            expression = _parse_expression(interp.source)
+        except SyntaxError as e:
+            # Report the error the same way eval() of the faulty expression would.
+            msg = f"Failed to evaluate expression '{interp.expression}': {e}"
+            raise SyntaxError(msg) from e
+        ast.increment_lineno(expression, line - 1)
+        line_starts.append(line)
+        line = (expression.end_lineno or expression.lineno) + 1
+        expressions.append(expression)
+
+    tree = ast.Expression(ast.Tuple(elts=expressions, ctx=ast.Load()))
+    ast.fix_missing_locations(tree)
+    code = compile(tree, _code_filename(template_string), "eval")
+    return code, tuple(line_starts)
+
+
+@lru_cache(maxsize=_DEFAULT_CACHE_SIZE)
+def _compile_expression(source: str) -> CodeType:
+    """Compile a single (dedented) expression, for lazy evaluation."""
+    return compile(source, "<string>", "eval")
+
+
+def _eval_field(
+    field: _ParsedInterpolation,
+    globals: dict[str, object] | None,
+    locals: Mapping[str, object] | None,
+) -> object:
+    """Evaluate a single expression, for lazy evaluation."""
+    try:
+        return eval(_compile_expression(field.source), globals, locals)
+    except Exception as e:
+        msg = f"Failed to evaluate expression '{field.expression}': {e}"
+        raise type(e)(msg) from e
+
+
+# Characters opening and closing brackets in expressions.
+_OPENING = "([{"
+_CLOSING = ")]}"
+
+# The common case of a replacement field whose expression has no brackets,
+# string literals, comments, debug specifier or operator using `!` or `=`,
+# which can be matched without scanning it character by character.
+_SIMPLE_FIELD_RE = re.compile(r"""([^{}()\[\]'"#!:=\\]+)(?:!([rsa]))?(?::([^{}]*))?}""")
+
+
+def _skip_string(s: str, i: int) -> int:
+    """Return the index just after the string literal starting at `s[i]`."""
+    quote = s[i] * 3 if s.startswith(s[i] * 3, i) else s[i]
+    i += len(quote)
+    n = len(s)
+    while i < n:
+        c = s[i]
+        if c == "\\":
+            i += 2
+        elif s.startswith(quote, i):
+            return i + len(quote)
+        elif c == "\n" and len(quote) == 1:
+            break
+        else:
+            i += 1
+    raise SyntaxError("f-string: unterminated string")
+
+
+def _is_conversion(s: str, i: int) -> bool:
+    """Whether `s[i:]` starts with a conversion (`!r`, `!s` or `!a`)."""
+    return s[i + 1 : i + 2] in ("a", "r", "s") and s[i + 2 : i + 3] in (":", "}")
+
+
+def _scan_expression(s: str, i: int) -> int:
+    """Return the index of the end of the expression starting at `s[i]`.
+
+    Like the f-string tokenizer, this skips over brackets, string literals
+    and comments, and stops at the first `}`, conversion, `:` or lone `=`
+    outside of them. A lone `=` may still be part of the expression: the
+    caller decides whether it is a debug specifier.
+    """
+    n = len(s)
+    depth = 0
+    while i < n:
+        c = s[i]
+        if c == "'" or c == '"':
+            i = _skip_string(s, i)
+            continue
+        if c == "#":
+            # A comment in a multiline expression, which may contain anything.
+            i = s.find("\n", i)
+            if i == -1:
+                break
+            continue
+        if c in _OPENING:
+            depth += 1
+        elif c in _CLOSING:
+            if depth == 0:
+                if c == "}":
+                    return i
+                raise SyntaxError(f"f-string: unmatched '{c}'")
+            depth -= 1
+        elif depth == 0:
+            if c == "!":
+                if s.startswith("!=", i):
+                    i += 2
+                    continue
+                if _is_conversion(s, i):
+                    return i
+                if s[i + 1 : i + 2] in ("a", "r", "s") and s.startswith("=", i + 2):
+                    raise SyntaxError(
+                        "f-string: cannot specify both conversion and '='"
+                    )
+                # Not valid Python: let the compiler report it.
+            elif c == ":":
+                return i
+            elif c == "=":
+                if s.startswith("==", i):
+                    i += 2
+                    continue
+                if i == 0 or s[i - 1] not in "<>":
+                    return i
+        i += 1
+    raise SyntaxError("f-string: expecting '}'")
+
+
+def _scan_field(
+    s: str, i: int, nested: bool = False
+) -> tuple[_ParsedInterpolation, str, int]:
+    """Scan the replacement field starting at `s[i]`, just after its `{`.
+
+    Returns the interpolation, the text added to the preceding static string
+    by a debug specifier (if any), and the index just after the closing `}`.
+    """
+    match = _SIMPLE_FIELD_RE.match(s, i)
+    if match is not None and not nested:
+        expression, conversion_char, format_spec = match.groups()
+        if expression.strip():
+            field = _ParsedInterpolation(
+                expression=expression,
+                source=textwrap.dedent(expression)
+                if "\n" in expression
+                else expression,
+                conversion=cast("Literal['a', 'r', 's'] | None", conversion_char),
+                format_spec=format_spec or "",
+            )
+            return field, "", match.end()
+
+    start = i
+    debug_text = ""
+    while True:
+        i = _scan_expression(s, i)
+        if s[i] != "=":
+            end = i
+            break
+        # `=` followed by optional whitespace and the end of the expression
+        # is a debug specifier, otherwise it is part of the expression.
+        j = i + 1
+        while j < len(s) and s[j] in " \t\r\n":
+            j += 1
+        if s[j : j + 1] in ("}", "!", ":") and not nested:
+            end = i
+            debug_text = s[start:j]
+            i = j
+            break
+        i += 1
+
+    expression = s[start:end]
+    if not expression.strip():
+        raise SyntaxError(f"f-string: valid expression required before '{s[i]}'")
+
+    conversion: Literal["a", "r", "s"] | None = None
+    if s[i] == "!":
+        if not _is_conversion(s, i):
+            raise SyntaxError(
+                "f-string: invalid conversion character: expected 's', 'r', or 'a'"
+            )
+        conversion = cast("Literal['a', 'r', 's']", s[i + 1])
+        i += 2
+
+    has_format_spec = s[i] == ":"
+    format_spec = ""
+    format_spec_parts: list[str | _ParsedInterpolation] = []
+    if has_format_spec:
+        i += 1
+        literal_start = i
+        while True:
+            next_open = s.find("{", i)
+            next_close = s.find("}", i)
+            if next_close == -1:
+                raise SyntaxError("f-string: expecting '}'")
+            if next_open == -1 or next_close < next_open:
+                break
+            if nested:
+                raise SyntaxError("f-string: expressions nested too deeply")
+            if next_open > literal_start:
+                format_spec_parts.append(s[literal_start:next_open])
+            field, _, i = _scan_field(s, next_open + 1, nested=True)
+            format_spec_parts.append(field)
+            literal_start = i
+        if not format_spec_parts:
+            format_spec = s[literal_start:next_close]
+        elif next_close > literal_start:
+            format_spec_parts.append(s[literal_start:next_close])
+        i = next_close
+
+    if debug_text:
+        # The debug specifier is syntactic sugar: t'{value=}' becomes
+        # t'value={value!r}' and t'{value=:fmt}' becomes t'value={value!s:fmt}'
+        expression = expression.strip()
+        if conversion is None:
+            conversion = "s" if has_format_spec else "r"
+
+    field = _ParsedInterpolation(
+        expression=expression,
+        # Dedent multiline expressions for evaluation
+        source=textwrap.dedent(expression) if "\n" in expression else expression,
+        conversion=conversion,
+        format_spec=format_spec,
+        format_spec_parts=tuple(format_spec_parts),
+    )
+    return field, debug_text, i + 1
+
+
+def _scan(
+    template_string: str,
+) -> tuple[tuple[str, ...], tuple[_ParsedInterpolation, ...]]:
+    """Split a template string into its static strings and interpolations.
+
+    This is a single pass over the string: static text is skipped with
+    `str.find()`, and replacement fields are scanned like the f-string
+    tokenizer does. `{{` and `}}` stand for literal braces. Debug specifiers
+    are resolved here: the `expression=` text is folded into the preceding
+    static string.
+    """
+    s = template_string
+    strings = []
+    interpolations = []
+    # The pieces of the static string being scanned
+    literal: list[str] = []
+    i = 0
+    # Position of the next braces, only searched again once passed
+    next_open = s.find("{")
+    next_close = s.find("}")
+
+    while True:
+        if -1 < next_open < i:
+            next_open = s.find("{", i)
+        if -1 < next_close < i:
+            next_close = s.find("}", i)
+
+        if next_open == -1 and next_close == -1:
+            literal.append(s[i:])
+            break
+
+        if next_close == -1 or -1 < next_open < next_close:
+            literal.append(s[i:next_open])
+            if s.startswith("{", next_open + 1):
+                literal.append("{")
+                i = next_open + 2
+                continue
+            interp, debug_text, i = _scan_field(s, next_open + 1)
+            literal.append(debug_text)
+            strings.append("".join(literal))
+            literal = []
+            interpolations.append(interp)
+        else:
+            literal.append(s[i:next_close])
+            if not s.startswith("}", next_close + 1):
+                raise SyntaxError("f-string: single '}' is not allowed")
+            literal.append("}")
+            i = next_close + 2
+
+    strings.append("".join(literal))
+    return tuple(strings), tuple(interpolations)
+
+
+def _is_simple_name(source: str) -> bool:
+    # Non-ASCII names are left to eval(), which normalizes them (NFKC).
+    return source.isidentifier() and source.isascii() and not iskeyword(source)
+
+
+# Names of the local variables of code objects, by id of the code object.
+# The code object is kept along, so that its id can't be reused meanwhile.
+_code_locals: dict[int, tuple[CodeType, frozenset[str]]] = {}
+
+
+def _local_names(code: CodeType) -> frozenset[str]:
+    """The names of the local, cell and free variables of a code object."""
+    entry = _code_locals.get(id(code))
+    if entry is None or entry[0] is not code:
+        if len(_code_locals) >= _DEFAULT_CACHE_SIZE:
+            _code_locals.clear()
+        names = frozenset(code.co_varnames + code.co_cellvars + code.co_freevars)
+        entry = _code_locals[id(code)] = (code, names)
+    return entry[1]
+
+
+def _lookup_names(frame: FrameType, names: tuple[str, ...]) -> tuple[object, ...]:
+    """Look up names in the scope of a frame, as `eval()` would.
+
+    `frame.f_locals` is costly in functions: it copies the local variables
+    into a dict (or, since 3.13, creates a proxy to them) on each access. It
+    is skipped when none of the names is a local variable of the function.
+    """
+    code = frame.f_code
+    namespaces: tuple[Mapping[str, object], ...]
+    if code.co_flags & _CO_OPTIMIZED and _local_names(code).isdisjoint(names):
+        namespaces = (frame.f_globals, frame.f_builtins)
+    else:
+        namespaces = (frame.f_locals, frame.f_globals, frame.f_builtins)
+
+    values = []
+    for name in names:
+        for namespace in namespaces:
+            value = namespace.get(name, _MISSING)
+            if value is not _MISSING:
+                values.append(value)
+                break
+        else:
+            msg = (
+                f"Failed to evaluate expression '{name}': name '{name}' is not defined"
+            )
+            raise NameError(msg)
+    return tuple(values)
+
+
+def _parse(template_string: str) -> _ParsedTemplate:
+    """Scan a template string and compile its expressions."""
+    strings, interpolations = _scan(template_string)
+    fields = tuple([field for interp in interpolations for field in interp.fields()])
+    code, line_starts = _compile(template_string, fields)
+    names = tuple([field.source.strip() for field in fields])
+    return _ParsedTemplate(
+        strings=_shape(strings),
+        interpolations=interpolations,
+        fields=fields,
+        code=code,
+        line_starts=line_starts,
+        names=names if code and all(map(_is_simple_name, names)) else None,
+    )
+
+
+# The parse of a template string never changes, so it is memoized: in a hot
+# code path, the same few template strings are parsed over and over again.
+# Looking up a literal is O(1) whatever its length: a str caches its hash, and
+# the dict lookup compares by identity first. This is why the cache is keyed
+# on the string rather than on the call site: a `(f_code, f_lasti)` key costs
+# more to build and hash than the lookup it would replace.
+_parse_cached: _lru_cache_wrapper[_ParsedTemplate] = lru_cache(
+    maxsize=_DEFAULT_CACHE_SIZE
+)(_parse)
+
+
+def cache_info() -> _CacheInfo:
+    """Return hit/miss statistics of the template parse cache.
+
+    The result is a named tuple `(hits, misses, maxsize, currsize)`, as
+    returned by `functools.lru_cache`.
+    """
+    return _parse_cached.cache_info()
+
+
+def cache_clear() -> None:
+    """Clear the template parse cache and its statistics."""
+    _parse_cached.cache_clear()
+    _shape.cache_clear()
+    _formatters.clear()
+
+
+def set_cache_size(maxsize: int | None) -> None:
+    """Set the maximum number of parsed template strings kept in memory.
+
+    Least recently used entries are discarded first. `None` makes the cache
+    unbounded and `0` disables it. The current content of the cache is lost.
+    """
+    global _parse_cached
+    _parse_cached = lru_cache(maxsize=maxsize)(_parse)
+
+
 def t(template_string: str, /) -> Template:
     """Emulates a PEP 750 t-string literal for Python < 3.14.
 
@@ -155,95 +806,240 @@ def t(template_string: str, /) -> Template:
         >>> template.interpolations[1]
         Interpolation(value='C', expression='unit', conversion='s', format_spec='')
     """  # noqa: E501
+    if _recorder is not None:
+        return _timed_t(template_string, sys._getframe(1), _recorder)
+
+    parsed = _parse_cached(template_string)
+
+    if parsed.code is None:
+        return Template(strings=parsed.strings, interpolations=())
+
     # Get the execution frame of the caller to evaluate expressions in their scope.
     # sys._getframe(0) is the frame of t()
     # sys._getframe(1) is the frame of the caller of t()
+    return _evaluate_in(parsed, sys._getframe(1))
+
+
+def _evaluate_in(parsed: _ParsedTemplate, frame: FrameType) -> Template:
+    """Evaluate the fields of a (non static) template in the scope of a frame."""
+    if parsed.names is not None:
+        values = _lookup_names(frame, parsed.names)
+        return Template(
+            strings=parsed.strings, interpolations=parsed.interpolate(values)
+        )
+
+    # Evaluate all the expressions at once using the caller's context
+    return parsed.evaluate(frame.f_globals, frame.f_locals)
+
+
+def _timed_t(
+    template_string: str,
+    frame: FrameType,
+    recorder: Callable[[str, str, float], None],
+) -> Template:
+    """`t()`, recording the time taken by each of its phases."""
+    start = perf_counter()
+    parsed = _parse_cached(template_string)
+    parsed_at = perf_counter()
+    if parsed.code is None:
+        template = Template(strings=parsed.strings, interpolations=())
+    else:
+        template = _evaluate_in(parsed, frame)
+    end = perf_counter()
+    recorder(template_string, "parse", parsed_at - start)
+    recorder(template_string, "evaluate", end - parsed_at)
+    return template
+
+
+# Marks a lazy interpolation whose value has not been computed yet.
+_MISSING = object()
+
+
+class _LazyInterpolation(Interpolation):
+    """An `Interpolation` whose value is computed when first accessed."""
+
+    __slots__ = ("_globals", "_locals", "_parsed", "_value")
+    _globals: dict[str, object] | None
+    _locals: Mapping[str, object] | None
+    _parsed: _ParsedInterpolation
+    _value: object
+
+    def __init__(
+        self,
+        parsed: _ParsedInterpolation,
+        format_spec: str,
+        globals: dict[str, object],
+        locals: Mapping[str, object],
+    ) -> None:
+        # Interpolation is frozen, and `value` is a property here.
+        object.__setattr__(self, "expression", parsed.expression)
+        object.__setattr__(self, "conversion", parsed.conversion)
+        object.__setattr__(self, "format_spec", format_spec)
+        object.__setattr__(self, "_parsed", parsed)
+        object.__setattr__(self, "_globals", globals)
+        object.__setattr__(self, "_locals", locals)
+        object.__setattr__(self, "_value", _MISSING)
+
+    @property
+    def value(self) -> object:  # type: ignore[override]
+        """The value of the expression, evaluated on first access."""
+        value = self._value
+        if value is _MISSING:
+            value = _eval_field(self._parsed, self._globals, self._locals)
+            object.__setattr__(self, "_value", value)
+            # The captured scope is not needed anymore.
+            object.__setattr__(self, "_globals", None)
+            object.__setattr__(self, "_locals", None)
+        return value
+
+    def __repr__(self) -> str:
+        """Same as `Interpolation`, which this class stands for."""
+        return (
+            f"Interpolation(value={self.value!r}, expression={self.expression!r}, "
+            f"conversion={self.conversion!r}, format_spec={self.format_spec!r})"
+        )
+
+
+def lazy_t(template_string: str, /) -> Template:
+    """Like `t()`, but the interpolations are evaluated on demand.
+
+    The caller's scope is captured when `lazy_t()` is called, but each
+    expression is only evaluated the first time the `value` of its
+    interpolation is accessed. This is useful when the consumer of the
+    template may never look at some or all of the values, e.g. a debug log
+    message that is filtered out.
+
+    Note that, unlike with `t()`, errors in the expressions (other than
+    syntax errors) are only raised when the value is accessed. Replacement
+    fields in format specs, as in `{value:{width}}`, are not deferred.
+
+    Example:
+        >>> calls = []
+        >>> def expensive():
+        ...     calls.append(1)
+        ...     return 42
+        >>> template = lazy_t("Result: {expensive()}")
+        >>> template.strings, calls
+        (('Result: ', ''), [])
+        >>> template.interpolations[0].value, template.interpolations[0].value
+        (42, 42)
+        >>> calls
+        [1]
+    """
+    parsed = _parse_cached(template_string)
+    if parsed.code is None:
+        return Template(strings=parsed.strings, interpolations=())
+
     caller_frame = sys._getframe(1)
     caller_globals = caller_frame.f_globals
     caller_locals = caller_frame.f_locals
+    # Take a snapshot of a function's locals: the frame may have moved on,
+    # or be gone, by the time the values are computed.
+    if caller_locals is not caller_globals:
+        caller_locals = dict(caller_locals)
 
-    strings = []
     interpolations = []
-    last_end = 0
-
-    for match in _INTERPOLATION_RE.finditer(template_string):
-        # Add the static string part before this interpolation
-        strings.append(template_string[last_end : match.start()])
-        last_end = match.end()
-
-        groups = match.groupdict()
-
-        # The debug specifier is syntactic sugar. It modifies both the
-        # preceding string part and the interpolation itself.
-        if groups["debug"]:
-            # t'{value=}' becomes t'value={value!r}'
-            # t'{value=:fmt}' becomes t'value={value!s:fmt}'
-
-            # Find the position of the '=' in the original match string
-            # so we can split the expression and the '=' (with whitespace)
-            expr_with_possible_ws = groups["expression"]
-            # Find the '=' at the end (possibly with whitespace before/after)
-            eq_index = expr_with_possible_ws.rfind("=")
-            if eq_index != -1:
-                expr_for_static = expr_with_possible_ws[: eq_index + 1]
-                # Remove trailing whitespace and the '=' for evaluation
-                expr_for_eval = expr_with_possible_ws[:eq_index]
-                # Strip all whitespace from both ends for evaluation
-                expr_for_eval = expr_for_eval.strip()
-                # Remove any trailing '=' if present (shouldn't be, but for safety)
-                if expr_for_eval.endswith("="):
-                    expr_for_eval = expr_for_eval[:-1].rstrip()
-            else:
-                expr_for_static = expr_with_possible_ws + "="
-                expr_for_eval = expr_with_possible_ws.strip()
-
-            # Prepend 'expression=' (with whitespace) to the *current* static string.
-            strings[-1] += expr_for_static
-
-            # For debug specifier, strip trailing '=' and whitespace for evaluation
-            # (already done above)
-
-            if groups["conversion"]:
-                raise SyntaxError("f-string: cannot specify both conversion and '='")
-
-            # If a format spec is present, conversion becomes 's'. Otherwise, 'r'.
-            conv_char: Literal["a", "r", "s"] | None = (
-                "s" if groups["format_spec"] else "r"
-            )
-            expression_to_eval = expr_for_eval
-        else:
-            conv_char = (
-                cast(Literal["a", "r", "s"], groups["conversion"][1])
-                if groups["conversion"]
-                else None
+    for interp in parsed.interpolations:
+        format_spec = interp.format_spec
+        if interp.format_spec_parts:
+            spec_values = (
+                _eval_field(field, caller_globals, caller_locals)
+                for field in interp.fields()
+                if field is not interp
             )
-            expression_to_eval = groups["expression"]
+            format_spec = _format_spec(interp.format_spec_parts, spec_values)
+        interpolations.append(
+            _LazyInterpolation(interp, format_spec, caller_globals, caller_locals)
+        )
 
-        fmt_spec = groups["format_spec"][1:] if groups["format_spec"] else ""
+    return Template(strings=parsed.strings, interpolations=tuple(interpolations))
 
-        # Dedent multiline expressions for evaluation
-        import textwrap
 
-        expr_eval_str = textwrap.dedent(expression_to_eval)
+# Rendering functions of `render_fstring()`, by static strings of template.
+_formatters: dict[tuple[str, ...], Callable[[tuple[Interpolation, ...]], str]] = {}
 
-        # Evaluate the expression to get its value using the caller's context
-        try:
-            value = eval(expr_eval_str, caller_globals, caller_locals)
-        except Exception as e:
-            # Re-raise with more context
-            msg = f"Failed to evaluate expression '{expression_to_eval}': {e}"
-            raise type(e)(msg) from e
 
-        interpolations.append(
-            Interpolation(
-                value=value,
-                expression=expression_to_eval,
-                conversion=conv_char,
-                format_spec=fmt_spec,
-            )
+def _render_generic(
+    interpolations: tuple[Interpolation, ...], strings: tuple[str, ...]
+) -> str:
+    """Render a template field by field, for any conversions and format specs."""
+    parts = [strings[0]]
+    for interp, string in zip(interpolations, strings[1:]):
+        value = _CONVERTERS[interp.conversion](interp.value)
+        parts.append(format(value, interp.format_spec))
+        parts.append(string)
+    return "".join(parts)
+
+
+def _make_formatter(template: Template) -> Callable[[tuple[Interpolation, ...]], str]:
+    """Generate a function rendering templates with the strings of `template`.
+
+    The conversions and format specs of `template` are built into an f-string
+    along with its strings, so that rendering is mostly a single f-string
+    evaluation, e.g. for `t("Hi {name!r:>10}!")`::
+
+        def format(interpolations):
+            (i0,) = interpolations
+            if i0.conversion == "r" and i0.format_spec == ">10":
+                return f"Hi {i0.value!r:>10}!"
+            return _render_generic(interpolations, strings)
+
+    Templates with the same strings but other conversions or format specs,
+    e.g. built from a dynamic format spec, are rendered by `_render_generic()`.
+    """
+    names = [f"i{index}" for index in range(len(template.interpolations))]
+    parts = []
+    guards = []
+    for index, string in enumerate(template.strings):
+        if string:
+            parts.append("f" + repr(string.replace("{", "{{").replace("}", "}}")))
+        if index == len(names):
+            break
+        name, interp = names[index], template.interpolations[index]
+        conversion = f"!{interp.conversion}" if interp.conversion else ""
+        guards.append(
+            f"{name}.conversion is None"
+            if interp.conversion is None
+            else f"{name}.conversion == {interp.conversion!r}"
         )
+        format_spec = interp.format_spec
+        if any(char in format_spec for char in "{}\\"):
+            # Can't be written literally in an f-string: look it up instead.
+            format_spec = f"{{{name}.format_spec}}"
+        else:
+            guards.append(f"{name}.format_spec == {format_spec!r}")
+        parts.append("f" + repr(f"{{{name}.value{conversion}:{format_spec}}}"))
+    source = (
+        "def format(interpolations):\n"
+        f"    ({''.join(name + ', ' for name in names)}) = interpolations\n"
+        f"    if {' and '.join(guards) or 'True'}:\n"
+        f"        return {' '.join(parts) or repr('')}\n"
+        "    return _render_generic(interpolations, strings)\n"
+    )
+    namespace: dict[str, Any] = {
+        "_render_generic": _render_generic,
+        "strings": template.strings,
+    }
+    exec(compile(source, "<t-string formatter>", "exec"), namespace)
+    return namespace["format"]
+
 
-    # Add the final static string part after the last interpolation
-    strings.append(template_string[last_end:])
+def render_fstring(template: Template) -> str:
+    """Render a template to a string, as the equivalent f-string would.
 
-    return Template(strings=tuple(strings), interpolations=tuple(interpolations))
+    Conversions and format specs are applied to the interpolations, e.g.:
+
+        >>> name, price = "tea", 2.5
+        >>> render_fstring(t("{name!r}: {price:.2f}"))
+        "'tea': 2.50"
+
+    A rendering function is generated, and cached, for each distinct tuple of
+    strings, so that rendering mostly evaluates a single f-string.
+    """
+    try:
+        formatter = _formatters[template.strings]
+    except KeyError:
+        if len(_formatters) >= _DEFAULT_CACHE_SIZE:
+            _formatters.clear()
+        formatter = _formatters[template.strings] = _make_formatter(template)
+    return formatter(template.interpolations)
@@ -0,0 +1,134 @@
+"""Render a template for many contexts, on several cores.
+
+`render_many()` evaluates a template string once per context, a mapping of
+the variables of its expressions, and renders each resulting template to a
+string, e.g. to send a mailing::
+
+    from tstrings.batch import render_many
+
+    contexts = [{"name": user.name, "items": user.cart} for user in users]
+    for body in render_many("Hello {name}, ...", contexts, workers=8):
+        send(body)
+
+The template string is sent to each worker process once, and parsed there
+once: each worker keeps its parse cache, and those of the rendering function
+(e.g. of `tdom.html()`) between contexts. The contexts are sent in chunks,
+with a bounded number of chunks in flight, so that a large (or endless)
+iterable of contexts is consumed as the results are.
+"""
+
+from __future__ import annotations
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import TYPE_CHECKING
+
+import tstrings
+
+from . import _ParsedTemplate, render_fstring
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator, Mapping
+    from concurrent.futures import Future
+
+    from . import Template
+
+__all__ = ["render_many"]
+
+# Chunks of contexts sent to the workers and not rendered yet, per worker.
+_CHUNKS_PER_WORKER = 2
+
+# The state of a worker process, set by `_init_worker()`.
+_parsed: _ParsedTemplate
+_render: Callable[[Template], str]
+
+
+def _init_worker(template_string: str, render: Callable[[Template], str]) -> None:
+    global _parsed, _render
+    # Looked up on each call, as `set_cache_size()` replaces the cache.
+    _parsed = tstrings._parse_cached(template_string)
+    _render = render
+
+
+def _evaluate(parsed: _ParsedTemplate, context: Mapping[str, object]) -> Template:
+    # Globals rather than locals, to be visible in comprehensions too.
+    namespace = dict(context)
+    return parsed.evaluate(namespace, namespace)
+
+
+def _render_chunk(contexts: list[Mapping[str, object]]) -> list[str]:
+    return [_render(_evaluate(_parsed, context)) for context in contexts]
+
+
+def _chunks(
+    iterable: Iterable[Mapping[str, object]], size: int
+) -> Iterator[list[Mapping[str, object]]]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def render_many(
+    template_string: str,
+    contexts: Iterable[Mapping[str, object]],
+    render: Callable[[Template], str] = render_fstring,
+    *,
+    workers: int | None = None,
+    chunksize: int = 64,
+) -> Iterator[str]:
+    """Render a template string for each context, in order.
+
+    The expressions of the template are evaluated with the variables of the
+    context as their only variables (besides builtins), then `render` turns
+    the template into a string. It must be a function that can be pickled,
+    e.g. defined at the module level.
+
+    If the evaluation or the rendering fails in a worker, the exception is
+    raised when the results of its chunk of contexts are reached.
+
+    Args:
+        template_string: The template, as it would be passed to `t()`.
+        contexts: The variables of each evaluation of the template.
+        render: The function rendering a template to a string,
+            `render_fstring()` by default.
+        workers: The number of worker processes, the number of CPUs by
+            default. With `1`, everything runs in the current process.
+        chunksize: The number of contexts sent to a worker at once.
+
+    Returns:
+        An iterator over the rendered strings, in the order of the contexts.
+    """
+    # Raise syntax errors right away, rather than on the first result.
+    parsed = tstrings._parse_cached(template_string)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}")
+    if chunksize < 1:
+        raise ValueError(f"chunksize must be at least 1, got {chunksize}")
+    if workers == 1:
+        return (render(_evaluate(parsed, context)) for context in contexts)
+    return _render_in_pool(template_string, contexts, render, workers, chunksize)
+
+
+def _render_in_pool(
+    template_string: str,
+    contexts: Iterable[Mapping[str, object]],
+    render: Callable[[Template], str],
+    workers: int,
+    chunksize: int,
+) -> Iterator[str]:
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(template_string, render),
+    ) as executor:
+        pending: deque[Future[list[str]]] = deque()
+        for chunk in _chunks(contexts, chunksize):
+            if len(pending) >= workers * _CHUNKS_PER_WORKER:
+                yield from pending.popleft().result()
+            pending.append(executor.submit(_render_chunk, chunk))
+        while pending:
+            yield from pending.popleft().result()
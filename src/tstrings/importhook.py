@@ -0,0 +1,346 @@
+"""An import hook precompiling `t("...")` calls at import time.
+
+In opted-in modules, each call to `t()` with a string literal as its only
+argument is rewritten into the direct construction of the `Template`::
+
+    t("Hello {name!r}!")
+
+becomes, in the compiled module::
+
+    Template(("Hello ", "!"), (Interpolation(name, "name", "r", ""),))
+
+so that, at runtime, there is no parsing, no frame introspection and no
+`eval()` left: the expressions are compiled with the rest of the module, as
+with native t-strings. Calls with any other argument are left untouched and
+go through the runtime `t()`.
+
+The hook must be installed before the modules are imported::
+
+    import tstrings.importhook
+
+    tstrings.importhook.install("myapp")
+
+    import myapp.views  # precompiled
+
+The transformed bytecode is cached in `__pycache__`, next to (but separate
+from) the regular bytecode, so that startup time does not regress.
+"""
+
+from __future__ import annotations
+
+import ast
+import hashlib
+import importlib.util
+import marshal
+import sys
+from functools import lru_cache
+from importlib.abc import MetaPathFinder
+from importlib.machinery import SourceFileLoader
+from typing import TYPE_CHECKING
+
+import tstrings
+
+from . import _parse, _parse_expression
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from importlib.machinery import ModuleSpec
+    from types import CodeType, ModuleType
+
+    from . import _ParsedInterpolation
+
+__all__ = ["install", "transform", "uninstall"]
+
+# Bump when the transformation changes, to invalidate cached bytecode. The
+# header of the cached bytecode also has a digest of the source of tstrings,
+# so that upgrading it invalidates the bytecode even if this wasn't bumped.
+_CACHE_TAG = "tstrings2"
+
+# Names under which Template and Interpolation are imported in transformed
+# modules. No double leading underscore, to avoid name mangling in classes.
+_TEMPLATE = "_tstrings_Template"
+_INTERPOLATION = "_tstrings_Interpolation"
+
+
+# The patterns of match statements binding names, from Python 3.10.
+_PATTERNS: tuple[type[ast.AST], ...] = tuple(
+    getattr(ast, name)
+    for name in ("MatchAs", "MatchStar", "MatchMapping")
+    if hasattr(ast, name)
+)
+
+
+def _bound_names(node: ast.AST) -> list[str]:
+    """The names bound by a node, other than by imports."""
+    if isinstance(node, ast.Name):
+        return [] if isinstance(node.ctx, ast.Load) else [node.id]
+    if isinstance(node, ast.arg):
+        return [node.arg]
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return [node.name]
+    if isinstance(node, (ast.ExceptHandler, *_PATTERNS)):
+        names = [getattr(node, field, None) for field in ("name", "rest")]
+        return [name for name in names if name is not None]
+    return []
+
+
+class _TemplateTransformer(ast.NodeTransformer):
+    """Rewrite `t("literal")` calls into `Template(...)` constructions."""
+
+    def __init__(self, tree: ast.Module) -> None:
+        self.function_names: set[str] = set()
+        self.module_names: set[str] = set()
+        # Names bound to anything else anywhere in the module, e.g. a `t`
+        # parameter: calls through them are left alone, whatever the scope.
+        rebound: set[str] = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ImportFrom) and node.module == "tstrings":
+                for alias in node.names:
+                    if alias.name == "t":
+                        self.function_names.add(alias.asname or "t")
+                    else:
+                        rebound.add(alias.asname or alias.name)
+            elif isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.name == "tstrings":
+                        self.module_names.add(alias.asname or "tstrings")
+                    else:
+                        rebound.add(alias.asname or alias.name.partition(".")[0])
+            else:
+                rebound.update(_bound_names(node))
+        self.function_names -= rebound
+        self.module_names -= rebound
+        self.changed = False
+
+    def _is_t(self, func: ast.expr) -> bool:
+        if isinstance(func, ast.Name):
+            return func.id in self.function_names
+        return (
+            isinstance(func, ast.Attribute)
+            and func.attr == "t"
+            and isinstance(func.value, ast.Name)
+            and func.value.id in self.module_names
+        )
+
+    def _expression(self, field: _ParsedInterpolation, call: ast.Call) -> ast.expr:
+        """The syntax tree of the expression of a field of a `t()` call."""
+        expr = _parse_expression(field.source)
+        # Point tracebacks to the line of the call.
+        ast.increment_lineno(expr, call.lineno - 1)
+        return self.visit(expr)
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        self.generic_visit(node)
+        if not (
+            self._is_t(node.func)
+            and len(node.args) == 1
+            and not node.keywords
+            and isinstance(node.args[0], ast.Constant)
+            and isinstance(node.args[0].value, str)
+        ):
+            return node
+
+        try:
+            template = self._template(node.args[0].value, node)
+        except SyntaxError:
+            # Let the runtime t() report the error when (and if) it is called.
+            return node
+        self.changed = True
+        return ast.fix_missing_locations(ast.copy_location(template, node))
+
+    def _template(self, template_string: str, call: ast.Call) -> ast.Call:
+        """The construction of the `Template` of a `t("literal")` call."""
+        parsed = _parse(template_string)
+        interpolations: list[ast.expr] = []
+        for interp in parsed.interpolations:
+            format_spec: ast.expr = ast.Constant(interp.format_spec)
+            if interp.format_spec_parts:
+                # Build the format spec with an f-string, as native t-strings do.
+                format_spec = ast.JoinedStr(
+                    values=[
+                        ast.Constant(part)
+                        if isinstance(part, str)
+                        else ast.FormattedValue(
+                            value=self._expression(part, call),
+                            conversion=ord(part.conversion) if part.conversion else -1,
+                            format_spec=ast.JoinedStr([ast.Constant(part.format_spec)])
+                            if part.format_spec
+                            else None,
+                        )
+                        for part in interp.format_spec_parts
+                    ]
+                )
+            interpolations.append(
+                ast.Call(
+                    func=ast.Name(id=_INTERPOLATION, ctx=ast.Load()),
+                    args=[
+                        self._expression(interp, call),
+                        ast.Constant(interp.expression),
+                        ast.Constant(interp.conversion),
+                        format_spec,
+                    ],
+                    keywords=[],
+                )
+            )
+        return ast.Call(
+            func=ast.Name(id=_TEMPLATE, ctx=ast.Load()),
+            args=[
+                ast.Tuple(
+                    elts=[ast.Constant(s) for s in parsed.strings], ctx=ast.Load()
+                ),
+                ast.Tuple(elts=interpolations, ctx=ast.Load()),
+            ],
+            keywords=[],
+        )
+
+
+def _add_import(tree: ast.Module) -> None:
+    """Import Template and Interpolation after the docstring and __future__."""
+    index = 0
+    for stmt in tree.body:
+        is_docstring = (
+            index == 0
+            and isinstance(stmt, ast.Expr)
+            and isinstance(stmt.value, ast.Constant)
+            and isinstance(stmt.value.value, str)
+        )
+        is_future = isinstance(stmt, ast.ImportFrom) and stmt.module == "__future__"
+        if not (is_docstring or is_future):
+            break
+        index += 1
+
+    node = ast.ImportFrom(
+        module="tstrings",
+        names=[
+            ast.alias(name="Template", asname=_TEMPLATE),
+            ast.alias(name="Interpolation", asname=_INTERPOLATION),
+        ],
+        level=0,
+    )
+    tree.body.insert(index, ast.fix_missing_locations(node))
+
+
+def transform(tree: ast.Module) -> ast.Module:
+    """Rewrite the `t("literal")` calls of a module's syntax tree in place."""
+    transformer = _TemplateTransformer(tree)
+    if transformer.function_names or transformer.module_names:
+        transformer.visit(tree)
+        if transformer.changed:
+            _add_import(tree)
+    return tree
+
+
+def _optimization() -> int:
+    """The optimization level of the interpreter, as set by `-O`."""
+    return sys.flags.optimize
+
+
+@lru_cache(maxsize=None)
+def _source_digest() -> bytes:
+    """A digest of the source of the parser and of the transformer."""
+    digest = hashlib.sha256()
+    for module in (tstrings, sys.modules[__name__]):
+        try:
+            with open(module.__file__ or "", "rb") as file:
+                digest.update(file.read())
+        except OSError:
+            # E.g. in a zip file: rely on _CACHE_TAG only.
+            pass
+    return digest.digest()[:8]
+
+
+class _TemplateLoader(SourceFileLoader):
+    """A source loader applying `transform()` to the modules it loads."""
+
+    def source_to_code(  # type: ignore[override]
+        self, data: bytes, path: str, *, _optimize: int = -1
+    ) -> CodeType:
+        source = importlib.util.decode_source(data)
+        tree = transform(ast.parse(source, filename=path))
+        return compile(tree, path, "exec", dont_inherit=True, optimize=_optimize)
+
+    def get_code(self, fullname: str) -> CodeType:
+        """Load the transformed code from its own bytecode cache if valid."""
+        source_path = self.get_filename(fullname)
+        # As for regular bytecode, a file per optimization level (`-O`).
+        optimize = _optimization()
+        cache_path = importlib.util.cache_from_source(
+            source_path, optimization=f"{_CACHE_TAG}o{optimize}"
+        )
+        stats = self.path_stats(source_path)
+        header = b"".join(
+            [
+                importlib.util.MAGIC_NUMBER,
+                (0).to_bytes(4, "little"),
+                (int(stats["mtime"]) & 0xFFFFFFFF).to_bytes(4, "little"),
+                (int(stats.get("size", 0)) & 0xFFFFFFFF).to_bytes(4, "little"),
+                _source_digest(),
+            ]
+        )
+        try:
+            data = self.get_data(cache_path)
+        except OSError:
+            pass
+        else:
+            if data[: len(header)] == header:
+                return marshal.loads(data[len(header) :])
+
+        code = self.source_to_code(
+            self.get_data(source_path), source_path, _optimize=optimize
+        )
+        if not sys.dont_write_bytecode:
+            self.set_data(cache_path, header + marshal.dumps(code))
+        return code
+
+
+class _TemplateFinder(MetaPathFinder):
+    """Hand the modules of opted-in packages to `_TemplateLoader`."""
+
+    def __init__(self) -> None:
+        self.packages: set[str] = set()
+
+    def _wants(self, fullname: str) -> bool:
+        return any(
+            fullname == package or fullname.startswith(package + ".")
+            for package in self.packages
+        )
+
+    def find_spec(
+        self,
+        fullname: str,
+        path: Sequence[str] | None,
+        target: ModuleType | None = None,
+    ) -> ModuleSpec | None:
+        if not self._wants(fullname):
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if type(spec.loader) is SourceFileLoader:
+                spec.loader = _TemplateLoader(spec.loader.name, spec.loader.path)
+            return spec
+        return None
+
+
+_finder = _TemplateFinder()
+
+
+def install(*packages: str) -> None:
+    """Precompile `t()` literals in the given packages or modules.
+
+    Submodules of a package are included. Only modules imported from now on
+    are affected.
+    """
+    _finder.packages.update(packages)
+    if _finder not in sys.meta_path:
+        sys.meta_path.insert(0, _finder)
+
+
+def uninstall() -> None:
+    """Remove the import hook, for all packages."""
+    _finder.packages.clear()
+    if _finder in sys.meta_path:
+        sys.meta_path.remove(_finder)
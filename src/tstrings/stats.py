@@ -0,0 +1,251 @@
+"""Opt-in timing of `t()` and of the rendering of templates, per template.
+
+Once enabled, each call of `t()` records the time spent getting the parse
+of its template string (from the cache, or parsing it) and evaluating its
+expressions. Renderers can record their own phases with `record()`, as the
+vendored tdom does for `html()`::
+
+    from tstrings import stats
+
+    stats.enable()
+    ...
+    stats.report(10)  # The 10 templates taking the most time.
+
+Timings can also be forwarded to a metrics system as they are recorded,
+with `add_hook()`, or read with `snapshot()`. When disabled, which is the
+default, the only cost for `t()` is checking whether it is enabled.
+
+A script can also be run with timing enabled, then a report printed, with::
+
+    python -m tstrings.stats [-n 10] script.py [args...]
+    python -m tstrings.stats [-n 10] -m module [args...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import runpy
+import sys
+import threading
+from collections import deque
+from typing import TYPE_CHECKING
+
+import tstrings
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from typing import TextIO
+
+__all__ = [
+    "add_hook",
+    "disable",
+    "enable",
+    "enabled",
+    "evictions",
+    "record",
+    "remove_hook",
+    "report",
+    "reset",
+    "snapshot",
+]
+
+# Number of most recent durations kept per template and phase, for
+# percentiles.
+_SAMPLES = 1000
+
+# The functions called with each timing, in order.
+_hooks: list[Callable[[str, str, float], None]] = []
+
+_lock = threading.Lock()
+
+
+class _Timings:
+    """The timings of a phase of a template."""
+
+    __slots__ = ("count", "max", "samples", "total")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: deque[float] = deque(maxlen=_SAMPLES)
+
+    def as_dict(self) -> dict[str, float]:
+        samples = sorted(self.samples)
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count,
+            "p50": _percentile(samples, 50),
+            "p90": _percentile(samples, 90),
+            "p99": _percentile(samples, 99),
+            "max": self.max,
+        }
+
+
+def _percentile(samples: list[float], percent: int) -> float:
+    # Nearest-rank percentile of sorted samples.
+    return samples[max(0, -(-len(samples) * percent // 100) - 1)]
+
+
+# Template -> phase -> timings, least recently recorded template first.
+_timings: dict[str, dict[str, _Timings]] = {}
+
+# The maximum number of templates in `_timings`, and the number of those
+# discarded to stay below it.
+_max_templates = 1000
+_evictions = 0
+
+
+def enable(max_templates: int = 1000) -> None:
+    """Start recording timings.
+
+    Args:
+        max_templates: The maximum number of templates whose timings are
+            kept. Beyond it, those of the least recently recorded template
+            are discarded, e.g. of templates built dynamically, so that
+            timings can stay enabled in a long-running process.
+    """
+    global _max_templates
+    _max_templates = max_templates
+    tstrings._recorder = record
+
+
+def disable() -> None:
+    """Stop recording timings, keeping those recorded."""
+    tstrings._recorder = None
+
+
+def enabled() -> bool:
+    """Whether timings are being recorded, e.g. to skip timing a phase."""
+    return tstrings._recorder is not None
+
+
+def reset() -> None:
+    """Discard the timings recorded."""
+    global _evictions
+    with _lock:
+        _timings.clear()
+        _evictions = 0
+
+
+def evictions() -> int:
+    """The number of templates whose timings were discarded since `reset()`."""
+    return _evictions
+
+
+def record(template: str, phase: str, seconds: float) -> None:
+    """Record the duration of a phase of the processing of a template.
+
+    Args:
+        template: The template, as a template string, e.g. for `Template`
+            instances, their strings joined with `"{}"`.
+        phase: The name of the phase, e.g. `"evaluate"` or `"tdom.build"`.
+        seconds: The duration of the phase.
+    """
+    global _evictions
+    with _lock:
+        # Templates are kept in order of use: pop and reinsert on each record.
+        phases = _timings.pop(template, None)
+        if phases is None:
+            phases = {}
+            if len(_timings) >= _max_templates:
+                del _timings[next(iter(_timings))]
+                _evictions += 1
+        _timings[template] = phases
+        timings = phases.get(phase)
+        if timings is None:
+            timings = phases[phase] = _Timings()
+        timings.count += 1
+        timings.total += seconds
+        if seconds > timings.max:
+            timings.max = seconds
+        timings.samples.append(seconds)
+    for hook in _hooks:
+        hook(template, phase, seconds)
+
+
+def add_hook(hook: Callable[[str, str, float], None]) -> None:
+    """Call `hook(template, phase, seconds)` with each timing recorded."""
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[str, str, float], None]) -> None:
+    """Stop calling a function added with `add_hook()`."""
+    _hooks.remove(hook)
+
+
+def snapshot() -> dict[str, dict[str, dict[str, float]]]:
+    """Return the timings recorded so far, per template and phase.
+
+    Each phase has the number of times it was recorded (`count`), the
+    total, mean and maximum durations, and the 50th, 90th and 99th
+    percentiles of the last 1000 durations, in seconds.
+    """
+    with _lock:
+        return {
+            template: {phase: timings.as_dict() for phase, timings in phases.items()}
+            for template, phases in _timings.items()
+        }
+
+
+def report(count: int = 10, file: TextIO | None = None) -> None:
+    """Print the timings of the templates taking the most time in total.
+
+    Args:
+        count: The number of templates to print.
+        file: Where to print, `sys.stdout` by default.
+    """
+    templates = sorted(
+        snapshot().items(),
+        key=lambda item: sum(phase["total"] for phase in item[1].values()),
+        reverse=True,
+    )
+    print(
+        f"{'phase':<16}{'count':>10}{'total ms':>12}{'mean us':>10}"
+        f"{'p50 us':>10}{'p99 us':>10}",
+        file=file,
+    )
+    for template, phases in templates[:count]:
+        text = template.replace("\n", "\\n")
+        print(text if len(text) <= 68 else text[:65] + "...", file=file)
+        for phase, timings in phases.items():
+            print(
+                f"  {phase:<14}{timings['count']:>10}{timings['total'] * 1e3:>12.3f}"
+                f"{timings['mean'] * 1e6:>10.1f}{timings['p50'] * 1e6:>10.1f}"
+                f"{timings['p99'] * 1e6:>10.1f}",
+                file=file,
+            )
+    if _evictions:
+        print(f"({_evictions} templates evicted, see enable())", file=file)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m tstrings.stats",
+        description="Run a script with timings of templates, and report them.",
+    )
+    parser.add_argument("-n", type=int, default=10, help="templates to report")
+    parser.add_argument("-m", dest="module", help="run a module, not a script")
+    parser.add_argument("target", nargs="?", help="the script to run")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    if args.module is None and args.target is None:
+        parser.error("expected a script or -m module")
+
+    enable()
+    try:
+        if args.module is not None:
+            sys.argv = [args.module, *([args.target] if args.target else [])]
+            sys.argv += args.args
+            runpy.run_module(args.module, run_name="__main__", alter_sys=True)
+        else:
+            sys.argv = [args.target, *args.args]
+            runpy.run_path(args.target, run_name="__main__")
+    finally:
+        disable()
+        report(args.n)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
-from tstrings import Template
+from collections import namedtuple
+
+from tstrings import Template, stats
 
 from .dom import (
     COMMENT,
@@ -12,69 +14,251 @@ from .dom import (
     Fragment,
     Node,
     Text,
-    _clone,
+    _replaceWith,
+    iter_render,
     parse,
+    render_to,
     unsafe,
 )
-from .utils import _Attribute, _Comment, _parse
+from .utils import (
+    _as_node,
+    _Attribute,
+    _Comment,
+    _compile_string,
+    _current_listeners,
+    _isawaitable,
+    _Listeners,
+    _ParseCache,
+    _set_listeners,
+)
+
+_parsed = _ParseCache()
+
+
+CacheInfo = namedtuple(
+    "CacheInfo", ["hits", "misses", "evictions", "maxsize", "currsize"]
+)
+
+
+def cache_info():
+    """Statistics of the cache of parsed templates."""
+    return CacheInfo(
+        _parsed.hits, _parsed.misses, _parsed.evictions, _parsed.maxsize, len(_parsed)
+    )
+
+
+def cache_clear():
+    """Clear the cache of parsed templates and its statistics."""
+    _parsed.clear()
+
+
+def set_cache_size(maxsize):
+    """Set the maximum number of parsed templates kept in the cache.
+
+    Least recently used entries are discarded first. `None` makes the cache
+    unbounded and `0` disables it.
+    """
+    _parsed.maxsize = maxsize
+    _parsed.clear()
+
+
+def set_cache_dir(directory):
+    """Save the parse of templates as files in `directory`, and load them.
+
+    A template not in the cache yet is looked up in the directory, by a
+    hash of its strings, and only parsed if it isn't there, so that the
+    processes sharing the directory, e.g. the workers of a server, or the
+    processes of the next deployment, parse each template once. `None`
+    stops using a directory.
+    """
+    _parsed.directory = None if directory is None else str(directory)
+
+
+def prewarm(templates, svg=False):
+    """Parse templates ahead of their first rendering, e.g. at startup."""
+    for template in templates:
+        _parsed.get(template.strings, len(template.interpolations), svg)
 
-_parsed = {}
-_listeners = []
 
 # from string.templatelib import Template
 
 
+def _build(strings, values, svg, entry=None):
+    # `entry` is the cached parse of `strings`, if already looked up.
+    if stats.enabled():
+        return _timed_build(strings, values, svg, entry)
+
+    if entry is None:
+        entry = _parsed.get(strings, len(values), svg)
+    node, holes = entry[2]()
+    _update(entry[1], holes, values)
+    return node
+
+
+def _update(updates, holes, values):
+    length = len(values)
+    listeners = _current_listeners()
+    changes = []
+    i = 0
+
+    for update, child in zip(updates, holes):
+        if isinstance(update.value, _Attribute):
+            changes.append(update.value(child, listeners))
+        elif isinstance(update.value, _Comment):
+            changes.append(update.value(child, update.index))
+        else:
+            changes.append(update.value(child, changes, update.index))
+
+    for i in range(length):
+        changes[i](values[i])
+
+    for i in range(len(changes) - 1, length - 1, -1):
+        changes[i]()
+
+
+def _timed_build(strings, values, svg, entry):
+    # _build(), recording the time taken by each phase. The update phase
+    # includes the rendering of components.
+    from time import perf_counter
+
+    start = perf_counter()
+    if entry is None:
+        entry = _parsed.get(strings, len(values), svg)
+    parsed = perf_counter()
+    node, holes = entry[2]()
+    built = perf_counter()
+    _update(entry[1], holes, values)
+    end = perf_counter()
+
+    template = "{}".join(strings)
+    stats.record(template, "tdom.parse", parsed - start)
+    stats.record(template, "tdom.build", built - parsed)
+    stats.record(template, "tdom.update", end - built)
+    return node
+
+
 def _util(svg):
     def fn(t):
         if not isinstance(t, Template):
             raise ValueError("Argument is not a Template instance")
 
-        strings = t.strings
+        return _build(t.strings, [entry.value for entry in t.interpolations], svg)
 
-        values = [entry.value for entry in t.interpolations]
+    return fn
 
-        length = len(values)
 
-        if strings not in _parsed:
-            _parsed[strings] = _parse(strings, length, svg)
+def _deferring(function, deferred):
+    # Calls `function`, and if it returns an awaitable, returns a placeholder
+    # to be replaced by its result once awaited.
+    def wrapper(*args, **kwargs):
+        result = function(*args, **kwargs)
+        if not _isawaitable(result):
+            return result
+        placeholder = Comment("")
+        deferred.append((placeholder, result))
+        return placeholder
 
-        content, updates = _parsed[strings]
+    # Components are inspected for a `children` parameter.
+    wrapper.__wrapped__ = function
+    return wrapper
 
-        node = _clone(content)
-        changes = []
-        path = None
-        child = None
-        i = 0
 
-        for update in updates:
-            if path != update.path:
-                path = update.path
-                child = node
-                for index in path:
-                    child = child["children"][index]
+async def ahtml(t):
+    """Render a template to a node, as `html(t)` does, awaiting its values.
 
-            if isinstance(update.value, _Attribute):
-                changes.append(update.value(child, _listeners))
-            elif isinstance(update.value, _Comment):
-                changes.append(update.value(child))
-            else:
-                changes.append(update.value(child, changes))
+    Interpolated awaitables, e.g. coroutines, are awaited and replaced by
+    their result. Components, and callables in place of nodes, may be
+    `async` functions. The awaitables are awaited concurrently with
+    `asyncio.gather()`, but in separate phases: first all the interpolated
+    values, then all the components and callables, then those returned by
+    the latter, and so on.
+    """
+    import asyncio
 
-        for i in range(length):
-            changes[i](values[i])
+    if not isinstance(t, Template):
+        raise ValueError("Argument is not a Template instance")
 
-        for i in range(len(changes) - 1, length - 1, -1):
-            changes[i]()
+    async def adopting(awaitable):
+        # Run in a task of its own by gather(): register the listeners of
+        # the nodes it renders with those of this render.
+        _set_listeners(listeners)
+        return await awaitable
 
-        return node
+    listeners = _current_listeners()
+    values = [entry.value for entry in t.interpolations]
+    pending = [i for i in range(len(values)) if _isawaitable(values[i])]
+    if pending:
+        results = await asyncio.gather(*[adopting(values[i]) for i in pending])
+        for i, result in zip(pending, results):
+            values[i] = result
 
-    return fn
+    deferred = []
+    entry = _parsed.get(t.strings, len(values), False)
+    updates = entry[1]
+    for i in range(len(values)):
+        if callable(values[i]) and not isinstance(updates[i].value, _Attribute):
+            values[i] = _deferring(values[i], deferred)
+
+    node = _build(t.strings, values, False, entry)
+
+    # Awaiting a component may yield callables returning awaitables in turn.
+    while deferred:
+        placeholders = [placeholder for placeholder, _ in deferred]
+        awaitables = [awaitable for _, awaitable in deferred]
+        deferred.clear()
+        results = await asyncio.gather(*map(adopting, awaitables))
+        for placeholder, result in zip(placeholders, results):
+            if callable(result):
+                result = _deferring(result, deferred)()
+            _replaceWith(placeholder, _as_node(result))
+
+    return node
+
+
+def html_string(t):
+    """Render a template to HTML, as `str(html(t))` would, but faster.
+
+    The HTML is built directly from the parsed template, without building
+    a tree of nodes, but for templates with components.
+    """
+    if stats.enabled():
+        from time import perf_counter
+
+        start = perf_counter()
+        result = _html_string(t)
+        stats.record("{}".join(t.strings), "tdom.html_string", perf_counter() - start)
+        return result
+    return _html_string(t)
+
+
+def _html_string(t):
+    if not isinstance(t, Template):
+        raise ValueError("Argument is not a Template instance")
+
+    interpolations = t.interpolations
+    entry = _parsed.get(t.strings, len(interpolations), False)
+    if len(entry) == 3:
+        # Compiled on first use, so that html() alone doesn't pay for it.
+        entry.append(_compile_string(entry[0], entry[1]))
+    render = entry[3]
+    values = [interpolation.value for interpolation in interpolations]
+    if render is None:
+        return str(_build(t.strings, values, False, entry))
+    return render(values, _current_listeners())
 
 
 def render(where, what):
-    result = where(what() if callable(what) else what, _listeners)
-    _listeners.clear()
-    return result
+    """Pass `what`, a node or a function returning one, to `where`.
+
+    `where` is called with the node and the list of the event listeners
+    referred to by its elements: those registered since the previous
+    `render()` of the current context, i.e. thread or asyncio task, so that
+    renders in other threads or tasks don't get mixed in.
+    """
+    node = what() if callable(what) else what
+    listeners = _current_listeners()
+    _set_listeners(_Listeners())
+    return where(node, listeners.handlers)
 
 
 html = _util(False)
@@ -87,15 +271,25 @@ __all__ = [
     "ELEMENT",
     "FRAGMENT",
     "TEXT",
+    "CacheInfo",
     "Comment",
     "DocumentType",
     "Element",
     "Fragment",
     "Node",
     "Text",
+    "ahtml",
+    "cache_clear",
+    "cache_info",
     "html",
+    "html_string",
+    "iter_render",
     "parse",
+    "prewarm",
     "render",
+    "render_to",
+    "set_cache_dir",
+    "set_cache_size",
     "svg",
     "unsafe",
 ]
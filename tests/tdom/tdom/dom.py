@@ -53,95 +53,224 @@ VOID_ELEMENTS = (
 )
 
 
-class Node(dict):
-    def __init__(self, **kwargs):
-        super().__init__(type=self.type, **kwargs)
+class Node:
+    # Nodes keep their fields in slots, rather than in a dict and an instance
+    # dict: they also support item access, e.g. `node["children"]`, for the
+    # fields listed in `_fields`.
+    __slots__ = ("parent",)
+    _fields = ("type",)
+
+    def __init__(self):
         self.parent = None
 
     def __getattr__(self, name):
-        return self[name] if name in self else None
+        # Only called for fields that other types of nodes have.
+        return None
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields or key == "type":
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def keys(self):
+        return self._fields
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self._fields]
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fields else default
 
 
 class Comment(Node):
+    __slots__ = ("data",)
+    _fields = ("type", "data")
     type = COMMENT
 
     def __init__(self, data):
-        super().__init__(data=data)
+        self.parent = None
+        self.data = data
 
     def __str__(self):
-        return f"<!--{self['data']!s}-->"
+        return f"<!--{self.data!s}-->"
 
 
 class DocumentType(Node):
+    __slots__ = ("data",)
+    _fields = ("type", "data")
     type = DOCUMENT_TYPE
 
     def __init__(self, data):
-        super().__init__(data=data)
+        self.parent = None
+        self.data = data
 
     def __str__(self):
-        return f"<!{self['data']}>"
+        return f"<!{self.data}>"
+
+
+def _escape(value):
+    # The HTML of a text or an attribute value. Numbers need no escaping, and
+    # objects with an `__html__()` method, as `Unsafe` and markupsafe's
+    # `Markup`, are HTML already.
+    cls = value.__class__
+    if cls is str:
+        return escape(value)
+    if cls is int or cls is float or cls is bool:
+        return str(value)
+    html = getattr(cls, "__html__", None)
+    if html is not None:
+        return html(value)
+    return escape(str(value))
 
 
 class Text(Node):
+    __slots__ = ("data",)
+    _fields = ("type", "data")
     type = TEXT
 
     def __init__(self, data):
-        super().__init__(data=data)
+        self.parent = None
+        self.data = data
 
     def __str__(self):
-        data = self["data"]
-        return data if isinstance(data, Unsafe) else escape(str(data))
+        return _escape(self.data)
 
 
 class Element(Node):
+    __slots__ = ("children", "name", "props", "xml")
+    _fields = ("type", "name", "xml", "props", "children")
     type = ELEMENT
 
     def __init__(self, name, xml=False):
-        super().__init__(name=name, xml=xml, props={}, children=[])
+        self.parent = None
+        self.name = name
+        self.xml = xml
+        self.props = {}
+        self.children = []
 
     def __str__(self):
-        xml = self["xml"]
-        name = self["name"]
-        html = f"<{name}"
-        for key, value in self["props"].items():
-            if value is not None:
-                if isinstance(value, bool):
-                    if value:
-                        html += f' {key}=""' if xml else f" {key}"
-                else:
-                    html += f' {key}="{escape(str(value))}"'
-        if len(self["children"]) > 0:
-            html += ">"
-            just_text = not xml and name.lower() in TEXT_ELEMENTS
-            for child in self["children"]:
-                html += child["data"] if just_text else str(child)
-            html += f"</{name}>"
-        elif xml:
-            html += " />"
-        else:
-            html += ">"
-            if name.lower() not in VOID_ELEMENTS:
-                html += "</" + name + ">"
-        return html
+        return "".join(_render(self))
 
 
 class Fragment(Node):
+    __slots__ = ("children",)
+    _fields = ("type", "children")
     type = FRAGMENT
 
     def __init__(self):
-        super().__init__(children=[])
+        self.parent = None
+        self.children = []
 
     def __str__(self):
-        return "".join(str(child) for child in self["children"])
+        return "".join(_render(self))
+
+
+def _start_tag(name, props, xml):
+    html = f"<{name}"
+    for key, value in props.items():
+        if value is not None:
+            if isinstance(value, bool):
+                if value:
+                    html += f' {key}=""' if xml else f" {key}"
+            elif value.__class__ is Unsafe:
+                # Trusted in text only.
+                html += f' {key}="{escape(value)}"'
+            else:
+                html += f' {key}="{_escape(value)}"'
+    return html
+
+
+def _render(root, chunk_size=None):
+    # Yield the HTML of a node in chunks of at least `chunk_size` characters
+    # (only one chunk if `None`), but for the last one.
+    # It uses an explicit stack rather than recursion, so that deep trees
+    # don't hit the recursion limit: it holds iterators over nodes, and over
+    # the closing tags of the elements being rendered.
+    parts = []
+    append = parts.append
+    stack = [iter((root,))]
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+            continue
+        if isinstance(node, str):
+            append(node)
+            continue
+
+        type = node.type
+        if type == ELEMENT:
+            xml = node.xml
+            name = node.name
+            children = node.children
+            start = _start_tag(name, node.props, xml)
+            if len(children) > 0:
+                append(start + ">")
+                if not xml and name.lower() in TEXT_ELEMENTS:
+                    for child in children:
+                        append(child["data"])
+                    append(f"</{name}>")
+                else:
+                    stack.append(iter((f"</{name}>",)))
+                    stack.append(iter(children))
+            elif xml:
+                append(start + " />")
+            elif name.lower() in VOID_ELEMENTS:
+                append(start + ">")
+            else:
+                append(f"{start}></{name}>")
+        elif type == TEXT:
+            append(_escape(node.data))
+        elif type == FRAGMENT:
+            stack.append(iter(node.children))
+        else:
+            append(str(node))
+
+        # Join the parts from time to time, rather than summing their sizes.
+        if chunk_size is not None and len(parts) >= 64:
+            chunk = "".join(parts)
+            parts.clear()
+            if len(chunk) >= chunk_size:
+                yield chunk
+            else:
+                append(chunk)
+
+    if parts:
+        yield "".join(parts)
+
+
+def iter_render(node, chunk_size=8192):
+    """Yield the HTML of a node in chunks of about `chunk_size` characters."""
+    return _render(node, chunk_size)
+
+
+def render_to(node, write, chunk_size=8192):
+    """Write the HTML of a node with `write`, e.g. the one of a file or a socket."""
+    for chunk in iter_render(node, chunk_size):
+        write(chunk)
 
 
 def _append(parent, node):
-    parent["children"].append(node)
+    parent.children.append(node)
     node.parent = parent
 
 
 def _appendChildren(parent, nodes, clone=False):
-    children = parent["children"]
+    children = parent.children
     for node in nodes:
         if clone:
             node = _clone(node)
@@ -150,28 +279,31 @@ def _appendChildren(parent, nodes, clone=False):
 
 
 def _clone(node):
-    type = node["type"]
+    type = node.type
     if type == FRAGMENT:
         fragment = Fragment()
-        _appendChildren(fragment, node["children"], True)
+        _appendChildren(fragment, node.children, True)
         return fragment
     if type == ELEMENT:
-        element = Element(node["name"], node["xml"])
-        element["props"] = node["props"].copy()
-        _appendChildren(element, node["children"], True)
+        element = Element(node.name, node.xml)
+        element.props = node.props.copy()
+        _appendChildren(element, node.children, True)
         return element
     if type == TEXT:
-        return Text(node["data"])
+        return Text(node.data)
     if type == COMMENT:
-        return Comment(node["data"])
+        return Comment(node.data)
     if type == DOCUMENT_TYPE:
-        return DocumentType(node["data"])
+        return DocumentType(node.data)
 
 
-def _replaceWith(current, node):
+def _replaceWith(current, node, index=None):
+    # `index` is the position of `current` in its parent, if known.
     parent = current.parent
-    children = parent["children"]
-    children[children.index(current)] = node
+    children = parent.children
+    if index is None:
+        index = children.index(current)
+    children[index] = node
     node.parent = parent
     current.parent = None
 
@@ -186,6 +318,9 @@ if _IS_MICRO_PYTHON:
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
 
+        def __html__(self):
+            return self
+
     def _attributes(props, attrs):
         while match := ATTRIBUTES.match(attrs.strip()):
             key = match.group(1)
@@ -263,7 +398,7 @@ if _IS_MICRO_PYTHON:
                     if closing:
                         j -= 1
                     if i < j:
-                        _attributes(node["props"], content[i:j])
+                        _attributes(node.props, content[i:j])
                     if closing:
                         j += 1
                         if not_void:
@@ -283,6 +418,9 @@ else:
         def __new__(cls, value, *args, **kwargs):
             return super(Unsafe, cls).__new__(cls, value)  # type: ignore[invalid-super-argument]
 
+        def __html__(self):
+            return self
+
     class DOMParser(HTMLParser):
         def __init__(self, xml=False):
             super().__init__()
@@ -296,7 +434,7 @@ else:
             if not self.xml and tag.lower() not in VOID_ELEMENTS:
                 self.node = element
 
-            props = element["props"]
+            props = element.props
             for name, value in attrs:
                 props[name] = value
 
@@ -324,7 +462,7 @@ else:
 
         def handle_comment(self, data):
             if data == "/":
-                self.handle_endtag(self.node["name"])
+                self.handle_endtag(self.node.name)
             elif not (data.startswith("#") and data.endswith("#")):
                 _append(self.node, Comment(data))
 
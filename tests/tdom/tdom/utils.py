@@ -5,27 +5,65 @@ from .dom import (
     COMMENT,
     ELEMENT,
     FRAGMENT,
+    TEXT_ELEMENTS,
+    VOID_ELEMENTS,
+    Comment,
+    DocumentType,
+    Element,
     Fragment,
     Node,
     Text,
+    _append,
     _appendChildren,
+    _escape,
     _replaceWith,
+    _start_tag,
 )
 from .dom import parse as domify
 from .parser import _instrument, _prefix
 
-if not _IS_MICRO_PYTHON:
+if _IS_MICRO_PYTHON:
+
+    def _isawaitable(value):
+        return hasattr(value, "__await__")
+
+else:
     import inspect
+    from weakref import WeakKeyDictionary
+
+    _isawaitable = inspect.isawaitable
+
+    # Component -> whether it has a `children` parameter. Weak keys, not to
+    # keep alive the components of discarded templates.
+    _takes_children = WeakKeyDictionary()
 
 
-def _as_comment(node):
-    return lambda value: _replaceWith(node, _as_node(value))
+def _has_children_parameter(component):
+    # Bound methods are created anew on each attribute access, and functions
+    # wrapped by ahtml() on each render: cache their function instead, which
+    # has the same parameters but `self`.
+    key = getattr(component, "__func__", component)
+    key = getattr(key, "__wrapped__", key)
+    try:
+        return _takes_children[key]
+    except KeyError:
+        result = _takes_children[key] = (
+            "children" in inspect.signature(component).parameters
+        )
+        return result
+    except TypeError:
+        # Not weakly referenceable.
+        return "children" in inspect.signature(component).parameters
 
 
-def _as_component(node, components):
+def _as_comment(node, index):
+    return lambda value: _replaceWith(node, _as_node(value), index)
+
+
+def _as_component(node, components, index):
     def component(value):
         def reveal():
-            if _IS_MICRO_PYTHON or ("children" in inspect.signature(value).parameters):
+            if _IS_MICRO_PYTHON or _has_children_parameter(value):
                 props = {"children": node["children"]}
                 for k, v in node["props"].items():
                     props[k] = v
@@ -44,27 +82,113 @@ def _as_component(node, components):
             else:
                 result = value(**props)
 
-            _replaceWith(node, _as_node(result))
+            _replaceWith(node, _as_node(result), index)
 
         components.append(reveal)
 
     return component
 
 
+def _nodes(value):
+    # The items of a list, tuple or generator, which must be nodes.
+    nodes = list(value)
+    for node in nodes:
+        if not isinstance(node, Node):
+            raise TypeError(f"Expected nodes in a list, got {type(node).__name__!r}")
+    return nodes
+
+
 def _as_node(value):
     if isinstance(value, Node):
         return value
     if isinstance(value, (list, tuple, GeneratorType)):
         node = Fragment()
-        _appendChildren(node, value)
+        _appendChildren(node, _nodes(value))
         return node
     if callable(value):
-        # TODO: this could be a hook pleace for asyncio
-        #       and run to completion before continuing
+        # With ahtml(), the result may be an awaitable, awaited afterwards.
         return _as_node(value())
     return Text(value)
 
 
+class _Listeners:
+    # The event listeners of a render, in the order of their index, as used
+    # by the `on*` attributes of the elements.
+    def __init__(self):
+        self.handlers = []
+        self._indexes = {}
+
+    def add(self, handler):
+        # Return the index of `handler`, adding it if it's a new one.
+        try:
+            i = self._indexes.get(handler)
+        except TypeError:
+            # Not hashable.
+            if handler in self.handlers:
+                return self.handlers.index(handler)
+            i = None
+        if i is None:
+            i = len(self.handlers)
+            self.handlers.append(handler)
+            try:
+                self._indexes[handler] = i
+            except TypeError:
+                pass
+        return i
+
+
+if _IS_MICRO_PYTHON:
+
+    class _ContextVar:
+        # The subset of `contextvars.ContextVar` used here, for a single
+        # context.
+        def __init__(self, name):
+            self._value = None
+
+        def get(self, default=None):
+            return default if self._value is None else self._value
+
+        def set(self, value):
+            self._value = value
+
+    def _owner():
+        return None
+
+else:
+    import sys
+    from contextvars import ContextVar as _ContextVar
+    from threading import get_ident
+
+    def _owner():
+        # The thread, and the asyncio task if any, running the code.
+        asyncio = sys.modules.get("asyncio")
+        if asyncio is not None and asyncio._get_running_loop() is not None:
+            return get_ident(), asyncio.current_task()
+        return get_ident(), None
+
+
+# The listeners registered in the current context (thread or asyncio task)
+# since its last `render()`, as `(owner, listeners)`. An asyncio task starts
+# with a copy of the context of its parent, referring to the same listeners:
+# they are only used by the task (or thread) that owns them.
+_listeners = _ContextVar("tdom_listeners")
+
+
+def _current_listeners():
+    owner = _owner()
+    current = _listeners.get(None)
+    if current is None or current[0] != owner:
+        current = owner, _Listeners()
+        _listeners.set(current)
+    return current[1]
+
+
+def _set_listeners(listeners):
+    # Make the current task (or thread) register its listeners in
+    # `listeners`, e.g. those of the render it's part of.
+    _listeners.set((_owner(), listeners))
+
+
 def _as_prop(node, name, listeners):
     props = node["props"]
 
@@ -81,12 +205,7 @@ def _as_prop(node, name, listeners):
             props[f"data-{k.replace('_', '-')}"] = v
 
     def listener(value):
-        if value in listeners:
-            i = listeners.index(value)
-        else:
-            i = len(listeners)
-            listeners.append(value)
-
+        i = listeners.add(value)
         props[name] = f"self.python_listeners?.[{i}](event)"
 
     def style(value):
@@ -110,13 +229,13 @@ def _as_prop(node, name, listeners):
 
 
 def _set_updates(node, updates, path):
-    type = node["type"]
+    type = node.type
     if type == ELEMENT:
-        if node["name"] == _prefix:
+        if node.name == _prefix:
             updates.append(_Update(path, _Component()))
 
         remove = []
-        props = node["props"]
+        props = node.props
         for key, name in props.items():
             if key.startswith(_prefix):
                 remove.append(key)
@@ -127,11 +246,11 @@ def _set_updates(node, updates, path):
 
     if type == ELEMENT or type == FRAGMENT:
         i = 0
-        for child in node["children"]:
+        for child in node.children:
             _set_updates(child, updates, [*path, i])
             i += 1
 
-    elif type == COMMENT and node["data"] == _prefix:
+    elif type == COMMENT and node.data == _prefix:
         updates.append(_Update(path, _Comment()))
 
 
@@ -144,34 +263,454 @@ class _Attribute:
 
 
 class _Comment:
-    def __call__(self, node):
-        return _as_comment(node)
+    def __call__(self, node, index):
+        return _as_comment(node, index)
 
 
 class _Component:
-    def __call__(self, node, updates):
-        return _as_component(node, updates)
+    def __call__(self, node, updates, index):
+        return _as_component(node, updates, index)
 
 
 class _Update:
     def __init__(self, path, update):
         self.path = path
+        # The position of the node in its parent, which replacing the node
+        # of a comment or a component doesn't change.
+        self.index = path[-1] if path else None
         self.value = update
 
 
+if not _IS_MICRO_PYTHON:
+    import re
+    from html import unescape
+
+    # The tokens of a template, its interpolations being "\x01": comments,
+    # declarations, processing instructions, end tags (with `<//>` closing
+    # the current element), start tags and interpolations.
+    _tokens = re.compile(
+        r"<!--(.*?)-->"
+        r"|<!([^>]*)>"
+        r"|<\?[^>]*>"
+        r"|</(/?|[a-zA-Z][^\s>]*)\s*>"
+        r"""|<(\x01|[a-zA-Z][^\s/>\x01]*)((?:[^>"']|"[^"]*"|'[^']*')*?)(/?)>"""
+        r"|\x01",
+        re.DOTALL,
+    )
+
+    _attribute = re.compile(r"""([^\s/>=]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>]*))?""")
+
+    # Elements whose content is raw text, as for `html.parser`.
+    _raw_text_end = {
+        "script": re.compile(r"</script[\s>]", re.IGNORECASE),
+        "style": re.compile(r"</style[\s>]", re.IGNORECASE),
+    }
+
+
+def _scan_text(node, path, data, holes):
+    # Raw text, with interpolations as comment holes.
+    parts = data.split("\x01")
+    for part in parts[:-1]:
+        if part.strip():
+            _append(node, Text(part))
+        holes.append(([*path, len(node.children)], _Comment()))
+        _append(node, Comment(_prefix))
+    if parts[-1].strip():
+        _append(node, Text(parts[-1]))
+
+
+def _scan_attributes(element, attributes, path, holes):
+    props = element.props
+    for match in _attribute.finditer(attributes):
+        name, value = match.group(1, 2)
+        if value is None:
+            props[name.lower()] = None
+            continue
+        if len(value) > 1 and value[0] == value[-1] and value[0] in "\"'":
+            value = value[1:-1]
+        if value == "\x01":
+            holes.append((path, _Attribute(name)))
+        else:
+            props[name.lower()] = unescape(value) if "&" in value else value
+
+
+def _scan(template, xml):
+    # Parse the strings of a template into a tree, as `domify()` parses the
+    # HTML of `_instrument()`, in a single pass, and list its holes: (path,
+    # update) pairs, in the order of the interpolations.
+    content = "\x01".join(template).strip()
+    root = node = Fragment()
+    path = []
+    holes = []
+    search = _tokens.search
+    pos = 0
+    while True:
+        match = search(content, pos)
+        end = len(content) if match is None else match.start()
+        if pos < end:
+            data = content[pos:end]
+            if data.strip():
+                _append(node, Text(unescape(data) if "&" in data else data))
+        if match is None:
+            break
+        pos = match.end()
+
+        comment, declaration, end_tag, name = match.group(1, 2, 3, 4)
+        if comment is not None:
+            if not (comment.startswith("#") and comment.endswith("#")):
+                _append(node, Comment(comment))
+        elif declaration is not None:
+            _append(node, DocumentType(declaration))
+        elif end_tag is not None:
+            if end_tag == "" or end_tag == "/":
+                end_tag = node.name or ""
+            if not xml and end_tag.lower() not in VOID_ELEMENTS and node.parent:
+                node = node.parent
+                path = path[:-1]
+        elif name is not None:
+            element_path = [*path, len(node.children)]
+            if name == "\x01":
+                element = Element(_prefix, xml)
+                holes.append((element_path, _Component()))
+            else:
+                element = Element(name.lower(), xml)
+            _append(node, element)
+            if match.group(5):
+                _scan_attributes(element, match.group(5), element_path, holes)
+            if match.group(6):
+                continue
+            if not (xml or element.name in VOID_ELEMENTS):
+                node = element
+                path = element_path
+            if element.name in _raw_text_end:
+                match = _raw_text_end[element.name].search(content, pos)
+                end = len(content) if match is None else match.start()
+                _scan_text(node, path, content[pos:end], holes)
+                pos = end
+        elif match.group(0) == "\x01":
+            holes.append(([*path, len(node.children)], _Comment()))
+            _append(node, Comment(_prefix))
+
+    if len(root.children) == 1:
+        node = root.children[0]
+        if node.type != ELEMENT or node.name != _prefix:
+            root = node
+            holes = [(path[1:], update) for path, update in holes]
+
+    return root, holes
+
+
 def _parse(template, length, svg):
-    updates = []
-    content = _instrument(template, svg)
-    fragment = domify(content, svg)
+    if _IS_MICRO_PYTHON:
+        updates = []
+        content = _instrument(template, svg)
+        fragment = domify(content, svg)
 
-    if len(fragment["children"]) == 1:
-        node = fragment["children"][0]
-        if node["type"] != ELEMENT or node["name"] != _prefix:
-            fragment = node
+        if len(fragment.children) == 1:
+            node = fragment.children[0]
+            if node.type != ELEMENT or node.name != _prefix:
+                fragment = node
 
-    _set_updates(fragment, updates, [])
+        _set_updates(fragment, updates, [])
+    else:
+        fragment, holes = _scan(template, svg)
+        updates = [_Update(path, update) for path, update in holes]
 
     if len(updates) != length:
         raise ValueError(f"{len(updates)} updates found, expected {length}")
 
-    return [fragment, updates]
+    return [fragment, updates, _compile_builder(fragment, updates)]
+
+
+def _compile_builder(root, updates):
+    return _builder(*_flatten(root, updates))
+
+
+def _flatten(root, updates):
+    # Flatten the tree of `root` into a program building a copy of it, as
+    # `_clone` would, in a single pass: one instruction per node, in document
+    # order, with its class, the arguments of its constructor, its props (for
+    # elements), and the index of its parent. Return it with the index of the
+    # node of each update.
+    program = []
+    indexes = {}
+
+    def flatten(node, path, parent):
+        index = len(program)
+        indexes[tuple(path)] = index
+        type = node.type
+        if type == ELEMENT:
+            program.append((Element, (node.name, node.xml), node.props, parent))
+        elif type == FRAGMENT:
+            program.append((Fragment, (), None, parent))
+        else:
+            program.append((node.__class__, (node.data,), None, parent))
+        if type == ELEMENT or type == FRAGMENT:
+            for i, child in enumerate(node.children):
+                flatten(child, [*path, i], index)
+
+    flatten(root, [], -1)
+    return program, [indexes[tuple(update.path)] for update in updates]
+
+
+def _builder(program, holes):
+    def build():
+        # Return the new tree, and the node of each update.
+        nodes = []
+        append = nodes.append
+        for cls, args, props, parent in program:
+            node = cls(*args)
+            if props:
+                node.props = props.copy()
+            if parent >= 0:
+                parent = nodes[parent]
+                parent.children.append(node)
+                node.parent = parent
+            append(node)
+        return nodes[0], [nodes[i] for i in holes]
+
+    return build
+
+
+def _as_html(value):
+    # The HTML of a node replacing a comment hole, as `_as_node` makes it.
+    if isinstance(value, Node):
+        return str(value)
+    if isinstance(value, (list, tuple, GeneratorType)):
+        return "".join([str(node) for node in _nodes(value)])
+    if callable(value):
+        return _as_html(value())
+    return _escape(value)
+
+
+def _as_start_tag(node, names):
+    # A dynamic start tag, for an element with attribute holes.
+    name = node.name
+    xml = node.xml
+    static_props = node.props
+
+    def start_tag(values, listeners):
+        element = {"name": name, "props": static_props.copy()}
+        for attribute in names:
+            _as_prop(element, attribute, listeners)(next(values))
+        return _start_tag(name, element["props"], xml)
+
+    return start_tag
+
+
+def _compile_string(root, updates):
+    # Compile the tree of `root` into a function rendering its HTML directly,
+    # as `str(html(template))` would, without building a tree: static HTML
+    # is joined with the HTML of the holes, escaped as needed. The function
+    # is `None` if the template has components, which need the tree.
+    holes = {}
+    for update in updates:
+        if isinstance(update.value, _Component):
+            return None
+        node = root
+        for index in update.path:
+            node = node.children[index]
+        holes.setdefault(id(node), []).append(update.value)
+
+    program = []
+
+    def static(html):
+        if program and isinstance(program[-1], str):
+            program[-1] += html
+        else:
+            program.append(html)
+
+    def add(node):
+        type = node.type
+        node_holes = holes.get(id(node))
+        if type == COMMENT and node_holes:
+            program.append(lambda values, listeners: _as_html(next(values)))
+        elif type == FRAGMENT:
+            for child in node.children:
+                add(child)
+        elif type != ELEMENT:
+            static(str(node))
+        else:
+            name = node.name
+            xml = node.xml
+            children = node.children
+            if node_holes:
+                names = [update.name for update in node_holes]
+                program.append(_as_start_tag(node, names))
+            else:
+                static(_start_tag(name, node.props, xml))
+            if len(children) > 0:
+                static(">")
+                if not xml and name.lower() in TEXT_ELEMENTS:
+                    for child in children:
+                        if id(child) in holes:
+                            program.append(_as_raw_text)
+                        else:
+                            static(child["data"])
+                else:
+                    for child in children:
+                        add(child)
+                static(f"</{name}>")
+            elif xml:
+                static(" />")
+            elif name.lower() in VOID_ELEMENTS:
+                static(">")
+            else:
+                static(f"></{name}>")
+
+    add(root)
+
+    def render(values, listeners):
+        values = iter(values)
+        return "".join(
+            [
+                part if isinstance(part, str) else part(values, listeners)
+                for part in program
+            ]
+        )
+
+    return render
+
+
+def _as_raw_text(values, listeners):
+    # The text of a hole in a <script>, <style> or other text-only element.
+    return _as_node(next(values))["data"]
+
+
+# The version of the format of the parsed templates saved by `_ParseCache`,
+# to change whenever the parse of a template or the format changes.
+_FORMAT_VERSION = 1
+
+
+# The classes of nodes in the programs saved by `_ParseCache`.
+_classes = {
+    "e": Element,
+    "f": Fragment,
+    "t": Text,
+    "c": Comment,
+    "d": DocumentType,
+}
+_kinds = {cls: kind for kind, cls in _classes.items()}
+
+
+def _dump_program(program):
+    # A program as JSON data, with `_prefix` as "\x01", since it differs for
+    # each process.
+    data = []
+    for cls, args, props, parent in program:
+        if args and args[0] == _prefix:
+            args = ("\x01", *args[1:])
+        data.append([_kinds[cls], args, props and list(props.items()), parent])
+    return data
+
+
+def _load_program(data):
+    program = []
+    for kind, args, props, parent in data:
+        if args and args[0] == "\x01":
+            args = (_prefix, *args[1:])
+        program.append((_classes[kind], args, props and dict(props), parent))
+    return program
+
+
+def _dump_update(update):
+    value = update.value
+    if isinstance(value, _Attribute):
+        return [update.path, "a", value.name]
+    return [update.path, "c" if isinstance(value, _Comment) else "e"]
+
+
+def _load_update(data):
+    if data[1] == "a":
+        return _Update(data[0], _Attribute(data[2]))
+    return _Update(data[0], _Comment() if data[1] == "c" else _Component())
+
+
+class _ParseCache:
+    """A least recently used cache of the parse of templates, by strings."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        # A directory where to save the parse of templates, for other
+        # processes, or `None`.
+        self.directory = None
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, strings, length, svg):
+        entries = self._entries
+        # Entries are kept in order of use: pop and reinsert on each hit.
+        entry = entries.pop(strings, None)
+        if entry is None:
+            self.misses += 1
+            if self.directory is None:
+                entry = _parse(strings, length, svg)
+            else:
+                entry = self._load(strings, length, svg)
+            if self.maxsize == 0:
+                return entry
+            if self.maxsize is not None and len(entries) >= self.maxsize:
+                del entries[next(iter(entries))]
+                self.evictions += 1
+        else:
+            self.hits += 1
+        entries[strings] = entry
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _load(self, strings, length, svg):
+        # Parse a template, or load its parse from the directory, saving it
+        # there if it wasn't.
+        import json
+        import os
+        from hashlib import sha256
+        from tempfile import mkstemp
+
+        key = json.dumps([_FORMAT_VERSION, svg, strings])
+        path = os.path.join(self.directory, sha256(key.encode()).hexdigest() + ".json")
+        try:
+            with open(path, encoding="utf-8") as file:
+                data = json.load(file)
+            build = _builder(_load_program(data["program"]), data["holes"])
+            updates = [_load_update(update) for update in data["updates"]]
+        except (OSError, ValueError, LookupError, TypeError):
+            pass
+        else:
+            if len(updates) == length:
+                return [build()[0], updates, build]
+
+        entry = _parse(strings, length, svg)
+        program, holes = _flatten(entry[0], entry[1])
+        data = {
+            "program": _dump_program(program),
+            "holes": holes,
+            "updates": [_dump_update(update) for update in entry[1]],
+        }
+        # Write to a temporary file first, not to expose a partial file to
+        # other processes, or threads: each writer has a file of its own.
+        try:
+            fd, temporary = mkstemp(suffix=".tmp", dir=self.directory)
+        except OSError:
+            return entry
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(data, file, ensure_ascii=False, separators=(",", ":"))
+            # Readable by other users, as a file made by open() would be.
+            os.chmod(temporary, 0o644)
+            os.replace(temporary, path)
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+        return entry
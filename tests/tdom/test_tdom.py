@@ -1,11 +1,35 @@
 """Cover the examples in Andrea's demo."""
 
+import asyncio
+import json
+import os
+from contextvars import Context
 from random import random
+from threading import Barrier, Thread
 from unittest import skip
 
-from tstrings import t
-
-from .tdom import html, unsafe
+import pytest
+
+from tstrings import stats, t
+
+from .tdom import (
+    ELEMENT,
+    CacheInfo,
+    Element,
+    ahtml,
+    cache_clear,
+    cache_info,
+    html,
+    html_string,
+    iter_render,
+    prewarm,
+    render,
+    render_to,
+    set_cache_dir,
+    set_cache_size,
+    unsafe,
+)
+from .tdom.dom import _prefix
 
 assert unsafe
 assert random
@@ -57,6 +81,113 @@ def test_click_handler():
     assert str(result) == '<div onclick="self.python_listeners?.[0](event)"></div>'
 
 
+def test_render_listeners():
+    """Each render gets its own listeners, in each thread."""
+    results = {}
+
+    def page(name):
+        def on_click(event):
+            pass
+
+        def on_input(event):
+            pass
+
+        assert on_click and on_input
+        return html(
+            t(
+                "<p @click={on_click}><input @input={on_input}>"
+                "<button @click={on_click} /></p>"
+            )
+        )
+
+    def where(node, listeners):
+        return str(node), list(listeners)
+
+    def worker(name):
+        for _ in range(100):
+            results[name] = render(where, lambda: page(name))
+
+    threads = [Thread(target=worker, args=(name,)) for name in "abcd"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for markup, listeners in results.values():
+        assert [listener.__name__ for listener in listeners] == [
+            "on_click",
+            "on_input",
+        ]
+        assert markup == (
+            '<p onclick="self.python_listeners?.[0](event)">'
+            '<input oninput="self.python_listeners?.[1](event)">'
+            '<button onclick="self.python_listeners?.[0](event)"></button></p>'
+        )
+
+
+def test_render_listeners_tasks():
+    """Concurrent asyncio tasks don't share the listeners of their parent."""
+
+    def warm(event):
+        pass
+
+    def where(node, listeners):
+        return [listener.__name__ for listener in listeners]
+
+    async def handler(listener):
+        node = html(t("<button @click={listener} />"))
+        await asyncio.sleep(0.01)
+        return render(where, node)
+
+    def a(event):
+        pass
+
+    def b(event):
+        pass
+
+    async def main(handler, a, b):
+        return await asyncio.gather(handler(a), handler(b))
+
+    assert warm
+    html(t("<button @click={warm} />"))
+    try:
+        assert asyncio.run(main(handler, a, b)) == [["a"], ["b"]]
+    finally:
+        render(where, None)
+
+
+def test_ahtml_listeners():
+    """The listeners of awaited values are those of the render."""
+
+    def a(event):
+        pass
+
+    def b(event):
+        pass
+
+    async def fetch(b):
+        await asyncio.sleep(0)
+        return html(t("<button @click={b}>b</button>"))
+
+    def where(node, listeners):
+        return str(node), [listener.__name__ for listener in listeners]
+
+    async def main(a, b, fetch):
+        value = fetch(b)
+        assert value
+        node = await ahtml(t("<div><button @click={a}>a</button>{value}</div>"))
+        return render(where, node)
+
+    # In a new context, without listeners yet.
+    markup, listeners = Context().run(asyncio.run, main(a, b, fetch))
+    # The value is awaited, and rendered, first.
+    assert markup == (
+        '<div><button onclick="self.python_listeners?.[1](event)">a</button>'
+        '<button onclick="self.python_listeners?.[0](event)">b</button></div>'
+    )
+    assert listeners == ["b", "a"]
+
+
 def test_ignore_voided():
     """Voided elements."""
     result = html(t("<hr />"))
@@ -111,6 +242,28 @@ def test_unsafe():
     assert str(result2) == "<div><span>Hello World</span></div>"
 
 
+def test_escaping():
+    """Escape strings and other values, but numbers and HTML objects."""
+
+    class Markup(str):
+        def __html__(self):
+            return self
+
+    markup, text, number, flag = Markup("<b>&amp;</b>"), "<&>", 1.5, False
+    raw = unsafe('"<i>"')
+    assert markup and text and number and raw and not flag
+    result = html(
+        t(
+            "<p title={markup} data-n={number} alt={raw}>"
+            "{markup}{text}{number}{flag}</p>"
+        )
+    )
+    assert str(result) == (
+        '<p title="<b>&amp;</b>" data-n="1.5" alt="&quot;&lt;i&gt;&quot;">'
+        "<b>&amp;</b>&lt;&amp;&gt;1.5False</p>"
+    )
+
+
 def test_component():
     """Render a t-string that references a component."""
 
@@ -153,6 +306,39 @@ def test_component_without_children():
     assert '<div a="1" b="2"></div>' in str(result)
 
 
+def test_component_methods():
+    """Render components that are bound methods, with or without children."""
+
+    class Page:
+        def __init__(self, title):
+            self.title = title
+
+        def Header(self, children):
+            return html(t("<h1>{self.title}{children}</h1>"))
+
+        def Footer(self):
+            return html(t("<footer>{self.title}</footer>"))
+
+    for title in ("a", "b"):
+        page = Page(title)
+        assert page
+        result = html(t("<{page.Header}>!<//><{page.Footer} />"))
+        assert str(result) == f"<h1>{title}!</h1><footer>{title}</footer>"
+
+
+def test_many_holes():
+    """Replace many comments and components of a same parent, in place."""
+
+    def Item(children):
+        return html(t("<b>{children}</b>"))
+
+    a, b = "a", [html(t("<i>b</i>")), html(t("<i>c</i>"))]
+    assert Item and a and b
+    result = html(t("<p>{a}<{Item}>x<//>{b}<br>{a}<{Item}>y<//>{a}</p>"))
+    assert str(result) == "<p>a<b>x</b><i>b</i><i>c</i><br>a<b>y</b>a</p>"
+    assert [child.parent for child in result.children] == [result] * 7
+
+
 @skip("list rendering not implemented")
 def test_lists_within_layout():
     """A template in a template."""
@@ -170,3 +356,311 @@ def test_lists_within_layout():
     assert "<li>John</li>" in str(result)
     assert "<li>Jane</li>" in str(result)
     assert "<li>Jill</li>" in str(result)
+
+
+def test_parse_template():
+    """Parse templates as html.parser parses their HTML."""
+
+    def Box(children):
+        return html(t("<div>{children}</div>"))
+
+    value, items = "<&>", [1, 2]
+    assert Box and value and items
+    result = html(
+        t(
+            """
+            <!doctype html><!--#dev only#--><!--kept-->
+            <P Class="a &amp; b" title='{value}' id=x>
+                a &lt; b, {value} &gt; c
+            </P>
+            <script>if (a < b) {{ f({value}); }}</script>
+            <{Box}><img src="x.png"/><br><//>
+            <ul>{[html(t("<li>{item}</li>")) for item in items]}</>
+            """
+        )
+    )
+    assert str(result) == (
+        '<!doctype html><!--kept--><p class="a &amp; b" id="x" title="&lt;&amp;&gt;">'
+        "\n                a &lt; b, &lt;&amp;&gt; &gt; c\n            </p>"
+        "<script>if (a < b) { f(<&>); }</script>"
+        '<div><img src="x.png"><br></div>'
+        "<ul><li>1</li><li>2</li></ul>"
+    )
+
+
+def test_iter_render():
+    """Stream the HTML of a node in chunks."""
+    rows = [html(t("<li class={i}>{i} &lt; {i + 1}<br></li>")) for i in range(1000)]
+    assert rows
+    result = html(t("<script>a && b</script><ul>{rows}</ul>"))
+
+    chunks = list(iter_render(result, chunk_size=1000))
+    assert len(chunks) > 10
+    assert all(len(chunk) >= 1000 for chunk in chunks[:-1])
+    assert "".join(chunks) == str(result)
+
+    written = []
+    render_to(result, written.append)
+    assert "".join(written) == str(result)
+
+
+def test_iter_render_deep_tree():
+    """Deep trees don't hit the recursion limit."""
+    root = node = Element("div")
+    for _ in range(10000):
+        child = Element("div")
+        node["children"].append(child)
+        node = child
+
+    assert str(root) == "<div>" * 10001 + "</div>" * 10001
+
+
+def test_parse_cache():
+    """The cache of parsed templates is bounded and instrumented."""
+    templates = [t("<p>" + "x" * i + "</p>") for i in range(5)]
+    try:
+        set_cache_size(3)
+        prewarm(templates[:2])
+        assert cache_info() == CacheInfo(0, 2, 0, 3, 2)
+
+        for template in templates:
+            assert str(html(template)).startswith("<p>")
+        assert cache_info() == CacheInfo(2, 5, 2, 3, 3)
+
+        # The least recently used template was evicted.
+        html(templates[0])
+        assert cache_info().misses == 6
+
+        cache_clear()
+        assert cache_info() == CacheInfo(0, 0, 0, 3, 0)
+    finally:
+        set_cache_size(1024)
+
+
+def test_cache_dir(tmp_path):
+    """The parse of templates can be saved to and loaded from a directory."""
+
+    def Item(name, children):
+        return html(t("<li class={name}>{children}</li>"))
+
+    value, name = "<x>", "a"
+    assert Item and value and name
+    templates = [
+        t("<ul><{Item} name={name}><b>{value}</b><//></ul>"),
+        t("<!doctype html><p hidden title={value}>&amp; {value}<br></p>"),
+        t("<script>var x = {value};</script>"),
+    ]
+    expected = [str(html(template)) for template in templates]
+    try:
+        set_cache_dir(tmp_path)
+        cache_clear()
+        assert [str(html(template)) for template in templates] == expected
+        files = sorted(tmp_path.iterdir())
+        assert len(files) == 4
+        # The prefix of holes differs for each process.
+        assert all(_prefix not in file.read_text("utf-8") for file in files)
+
+        cache_clear()
+        assert [str(html(template)) for template in templates] == expected
+        assert [html_string(template) for template in templates] == expected
+
+        # Loaded rather than parsed, unless the file is invalid.
+        for file in files:
+            data = file.read_text("utf-8")
+            file.write_text(data.replace("var x", "var y") if "var x" in data else "{")
+        cache_clear()
+        assert [str(html(template)) for template in templates] == [
+            *expected[:2],
+            expected[2].replace("var x", "var y"),
+        ]
+        assert sorted(tmp_path.iterdir()) == files
+    finally:
+        set_cache_dir(None)
+        cache_clear()
+
+
+def test_cache_dir_threads(tmp_path, monkeypatch):
+    """Threads saving the same template don't write to the same file."""
+    writing = Barrier(2, timeout=5)
+    replaced = []
+    dump, replace = json.dump, os.replace
+
+    def dump_together(*args, **kwargs):
+        writing.wait()
+        dump(*args, **kwargs)
+
+    def record_replace(source, destination):
+        replaced.append(source)
+        replace(source, destination)
+
+    monkeypatch.setattr(json, "dump", dump_together)
+    monkeypatch.setattr(os, "replace", record_replace)
+    threads = [Thread(target=html, args=(t("<p>{1}</p>"),)) for _ in range(2)]
+    try:
+        set_cache_dir(tmp_path)
+        cache_clear()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        set_cache_dir(None)
+        cache_clear()
+    assert len(set(replaced)) == 2
+    assert [file.suffix for file in tmp_path.iterdir()] == [".json"]
+
+
+def test_renders_are_independent():
+    """Each render builds a new tree from the cached parse."""
+    results = []
+    for value in ["a", "b"]:
+        results.append(html(t("<!doctype html><p class={value}>x <b>{value}</b></p>")))
+
+    assert str(results[0]) == '<!doctype html><p class="a">x <b>a</b></p>'
+    assert str(results[1]) == '<!doctype html><p class="b">x <b>b</b></p>'
+    paragraph = results[0]["children"][1]
+    assert paragraph.parent is results[0]
+    assert paragraph["children"][1]["children"][0].parent is paragraph["children"][1]
+
+
+def test_html_string():
+    """Render templates to HTML without building a tree."""
+
+    def on_click(event):
+        pass
+
+    def Component(children):
+        return html(t("<section>{children}</section>"))
+
+    value, number, flag = '"a" & <b>', 4.5, True
+    style, data, aria = {"color": "red"}, {"user_id": 1}, {"role": "button"}
+    items = [html(t("<li>{i}</li>")) for i in range(3)]
+    assert on_click and Component and value and number and flag
+    assert style and data and aria and items
+
+    templates = [
+        t("<p class={value} hidden={flag} title={None}>{value} {number}</p>"),
+        t("<input disabled={flag} value={value}><br><img src=x />"),
+        t("<div style={style} data={data} aria={aria} @click={on_click} />"),
+        t("<!doctype html><!--comment--><ul>{items}</ul>{unsafe('<hr>')}"),
+        t("<script>var x = {str(number)};</script><textarea>{value}</textarea>"),
+        t("<div>{(lambda: html(t('<b>x</b>')))}</div> {tuple(items)}"),
+        t("<{Component}><p>{value}</p><//>"),
+        t("static <em>only</em>"),
+    ]
+    for template in templates:
+        assert html_string(template) == str(html(template))
+
+
+def test_list_of_strings():
+    """Lists can only hold nodes, not strings, which would not be escaped."""
+    items = ["<b>"]
+    assert items
+    with pytest.raises(TypeError, match="got 'str'"):
+        html(t("<p>{items}</p>"))
+    with pytest.raises(TypeError, match="got 'str'"):
+        html_string(t("<p>{items}</p>"))
+
+
+def test_node_fields():
+    """Nodes have slots, accessed as attributes or items."""
+    value = "x"
+    assert value
+    node = html(t("<p class={value}>text</p>"))
+
+    assert node.type == node["type"] == ELEMENT
+    assert node["props"] is node.props
+    assert dict(node) == {
+        "type": ELEMENT,
+        "name": "p",
+        "xml": False,
+        "props": {"class": "x"},
+        "children": node.children,
+    }
+    assert "data" not in node and node.data is None
+    assert node.children[0].get("data") == "text"
+    with pytest.raises(AttributeError):
+        node.other = "no instance dict"
+
+
+def test_ahtml():
+    """Await interpolated values and async components, concurrently."""
+    pending = []
+    most_pending = []
+
+    async def fetch(value):
+        pending.append(value)
+        most_pending.append(len(pending))
+        await asyncio.sleep(0)
+        pending.remove(value)
+        return value
+
+    async def Card(title, children):
+        content = await fetch(children)
+        assert content
+        return html(t("<div class={title}>{content}</div>"))
+
+    def Sync(title):
+        return html(t("<p>{title}</p>"))
+
+    def lazy():
+        return fetch("lazy")
+
+    async def main(Card, Sync, fetch, lazy):
+        title = fetch("Title")
+        assert title
+        page = t(
+            "<h1>{title}</h1><{Card} title=a>x<//><{Card} title=b>y<//>"
+            "<{Sync} title=c /><i>{lazy}</i>"
+        )
+        return await ahtml(page)
+
+    result = asyncio.run(main(Card, Sync, fetch, lazy))
+    assert str(result) == (
+        '<h1>Title</h1><div class="a">x</div><div class="b">y</div><p>c</p><i>lazy</i>'
+    )
+    # The values first, then the components and callables, all together.
+    assert max(most_pending) == 3
+
+
+def test_cache_info_single_lookup():
+    """A render looks its template up once in the cache."""
+
+    def Component(children):
+        return html(t("<section>{children}</section>"))
+
+    async def fetch():
+        return "a"
+
+    async def main(fetch):
+        value = fetch()
+        assert value
+        return await ahtml(t("<p>{value}</p>"))
+
+    assert Component
+    cache_clear()
+    assert str(asyncio.run(main(fetch))) == "<p>a</p>"
+    assert (cache_info().hits, cache_info().misses) == (0, 1)
+    cache_clear()
+    assert html_string(t("<{Component}>b<//>")) == "<section>b</section>"
+    assert (cache_info().hits, cache_info().misses) == (0, 2)
+
+
+def test_stats():
+    cache_clear()
+    stats.reset()
+    stats.enable()
+    try:
+        html(t("<p>{1}</p>"))
+        html(t("<p>{2}</p>"))
+        html_string(t("<p>{3}</p>"))
+    finally:
+        stats.disable()
+    phases = stats.snapshot()["<p>{}</p>"]
+    stats.reset()
+    assert {phase: timings["count"] for phase, timings in phases.items()} == {
+        "tdom.parse": 2,
+        "tdom.build": 2,
+        "tdom.update": 2,
+        "tdom.html_string": 1,
+    }
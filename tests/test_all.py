@@ -1,8 +1,18 @@
+import ast
+import importlib
+import io
+import os
+import pickle
 import sys
+import textwrap
 
 import pytest
 
-from tstrings import Interpolation, Template, t
+import tstrings
+import tstrings.batch
+import tstrings.importhook
+import tstrings.stats
+from tstrings import Interpolation, Template, TemplateBuilder, lazy_t, render_fstring, t
 
 
 def assert_interpolations_equal(actual: Interpolation, expected: Interpolation) -> None:
@@ -226,6 +236,88 @@ def test_debug_with_conversion_is_error():
         t("{var!r=}")
 
 
+def test_debug_specifier_with_spaces():
+    """Whitespace around '=' is kept in the static string, as in f-strings."""
+    x = 1
+    assert x
+    actual = t("{ x = }")
+    assert actual.strings == (" x = ", "")
+    assert actual.interpolations[0].expression == "x"
+    assert actual.interpolations[0].conversion == "r"
+
+
+def test_debug_specifier_with_conversion():
+    x = 1.5
+    assert x
+    actual = t("{x=!s:>6}")
+    assert actual.strings == ("x=", "")
+    assert actual.interpolations[0].conversion == "s"
+    assert actual.interpolations[0].format_spec == ">6"
+
+
+def test_escaped_braces():
+    """Doubled braces stand for literal braces."""
+    x = 1
+    assert x
+    actual = t("{{literal}} {x} {{{x}}}")
+    assert actual.strings == ("{literal} ", " {", "}")
+    assert actual.values == (1, 1)
+
+
+def test_single_closing_brace_is_error():
+    with pytest.raises(SyntaxError, match="single '}' is not allowed"):
+        t("oops }")
+
+
+def test_unclosed_brace_is_error():
+    with pytest.raises(SyntaxError, match="expecting '}'"):
+        t("oops {1 + 2")
+
+
+def test_empty_expression_is_error():
+    with pytest.raises(SyntaxError, match="valid expression required"):
+        t("oops {}")
+
+
+@pytest.mark.parametrize(
+    ("expression", "value"),
+    [
+        # A space is needed, `{{` is an escaped brace
+        (" {'a': 1}['a']", 1),
+        (" {1, 2} == {2, 1}", True),
+        ("'}' + \"{\"", "}{"),
+        ("'''a ' b'''", "a ' b"),
+        ("1 != 2", True),
+        ("1 <= 2 >= 1", True),
+        ("[1, 2, 3][1:]", [2, 3]),
+        ("(lambda x: x + 1)(1)", 2),
+        ("dict(a=1) == {'a': 1}", True),
+        ("'!r'", "!r"),
+    ],
+)
+def test_expressions_with_special_characters(expression, value):
+    """Braces, quotes, colons, `!` and `=` can appear in expressions."""
+    actual = t("<{" + expression + "}>")
+    assert actual.strings == ("<", ">")
+    assert actual.interpolations[0].expression == expression
+    assert actual.values == (value,)
+
+
+def test_nested_format_spec():
+    """Format specs can contain replacement fields."""
+    value, width, precision = 3.14159, 10, 3
+    assert value and width and precision
+    actual = t("{value:>{width}.{precision!s}f} {value:{'^'}8}")
+    assert actual.interpolations[0].format_spec == ">10.3f"
+    assert actual.interpolations[1].format_spec == "^8"
+    assert actual.values == (value, value)
+
+
+def test_too_deeply_nested_format_spec_is_error():
+    with pytest.raises(SyntaxError, match="nested too deeply"):
+        t("{1:{2:{3}}}")
+
+
 def test_undefined_variable_raises_error():
     """Ensures that an undefined variable in an expression raises NameError."""
     with pytest.raises(NameError):
@@ -238,6 +330,17 @@ def test_syntax_error_in_expression_raises_error():
         t("This is invalid: {1 +}")
 
 
+@pytest.mark.parametrize(
+    "template_string", ["{a for a in 'xy'}", "{a\\}", "{\\}", "{#\n}"]
+)
+def test_syntax_error_in_combined_expressions(template_string):
+    """Each expression is parsed on its own, not pasted into a larger one."""
+    a = 1
+    assert a
+    with pytest.raises(SyntaxError):
+        t(template_string)
+
+
 def test_interpolation_repr():
     """Ensures that the repr of an Interpolation instance is as expected."""
     interp = Interpolation("value", "expr", "r", ".2f")
@@ -353,6 +456,36 @@ def test_add_empty():
     assert_templates_equal(actual, expected)
 
 
+def test_shared_strings():
+    a, b = "A", "B"
+    assert a and b
+    templates = []
+    for value in (a, b):
+        assert value
+        templates.append(t("<p>{value}</p>") + t("<b>{a}</b>"))
+    templates.append(t("<p>{b}</p><b>{a}</b>"))
+    templates.append(Template.join(["<p>", t("{a}</p><b>{b}"), "</b>"]))
+    first = templates[0].strings
+    assert first == ("<p>", "</p><b>", "</b>")
+    assert all(template.strings is first for template in templates)
+
+
+def test_long_strings():
+    items = list(range(40))
+    assert items
+    template = t("{items[0]}" + "".join(f",{{items[{i}]}}" for i in range(1, 40)))
+    strings = template.strings
+    assert type(strings) is not tuple
+    assert strings == ("",) + (",",) * 39 + ("",)
+    assert hash(strings) == hash(tuple(strings))
+    assert {tuple(strings): 1}[strings] == 1
+    assert (template + t("")).strings == strings
+    assert (template + t("x")).strings == (*strings[:-1], "x")
+    copy = pickle.loads(pickle.dumps(strings))
+    assert copy == strings
+    assert hash(copy) == hash(strings)
+
+
 def test_add_not_supported():
     template = t("content")
     with pytest.raises(TypeError):
@@ -382,3 +515,452 @@ for part in template:
             assert False
 """
     exec(match_code, globals(), locals())
+
+
+def test_parse_cache():
+    """Parsing a template string again is served from the cache."""
+    tstrings.cache_clear()
+    name = "world"
+    assert name
+    t1 = t("Cached {name}!")
+    t2 = t("Cached {name}!")
+    assert t1.strings is t2.strings
+    assert t1.interpolations[0] is not t2.interpolations[0]
+    info = tstrings.cache_info()
+    assert info.hits == 1
+    assert info.misses == 1
+    assert info.currsize == 1
+
+
+def test_parse_cache_does_not_cache_values():
+    """Only the structure is cached, expressions are evaluated on each call."""
+    values = []
+    for i in range(3):
+        values.append(t("{i}").interpolations[0].value)
+    assert values == [0, 1, 2]
+
+
+def test_set_cache_size():
+    try:
+        tstrings.set_cache_size(2)
+        for text in ("a", "b", "c"):
+            t(text)
+        info = tstrings.cache_info()
+        assert info.maxsize == 2
+        assert info.currsize == 2
+        assert list(tstrings.batch.render_many("d", [{}], workers=1)) == ["d"]
+        assert tstrings.cache_info().misses == info.misses + 1
+    finally:
+        tstrings.set_cache_size(tstrings._DEFAULT_CACHE_SIZE)
+
+
+def test_error_names_failing_expression():
+    """With several interpolations, the error names the one that failed."""
+    a = 1
+    assert a
+    with pytest.raises(NameError) as exc_info:
+        t("{a} {a + 1} {\n    undefined_var\n} {a}")
+    assert "'\n    undefined_var\n'" in str(exc_info.value)
+
+    with pytest.raises(ZeroDivisionError) as exc_info:
+        t("{a} {a / 0}")
+    assert str(exc_info.value).startswith("Failed to evaluate expression 'a / 0'")
+
+
+def test_expression_with_comment():
+    """A comment in a multiline expression does not swallow what follows."""
+    a, b = 1, 2
+    assert a and b
+    template = t("{a # the first one\n} {b}")
+    assert template.values == (1, 2)
+
+
+def test_compiled_code_is_cached():
+    """Expressions are compiled once per template string."""
+    x = 1
+    assert x
+    t1 = t("{x} and {x + 1}")
+    parsed = tstrings._parse_cached("{x} and {x + 1}")
+    assert parsed.code is not None
+    assert parsed.code.co_filename == "<t-string '{x} and {x + 1}'>"
+    assert t1.values == (1, 2)
+
+
+def test_parse_cache_large_literal():
+    """A large literal is found in the cache through its cached hash."""
+    tstrings.cache_clear()
+    x = 1
+    assert x
+    source = "<div>" + "." * 10_000 + "{x}</div>"
+    for _ in range(3):
+        template = t(source)
+    assert template.values == (1,)
+    assert tstrings.cache_info().hits == 2
+
+
+def test_lazy_t():
+    """Values of a lazy template are computed on first access only."""
+    calls = []
+
+    def get_val():
+        calls.append(None)
+        return "lazy"
+
+    template = lazy_t("Value is {get_val()!r:>10}")
+    assert template.strings == ("Value is ", "")
+    assert calls == []
+    interp = template.interpolations[0]
+    assert isinstance(interp, Interpolation)
+    assert interp.expression == "get_val()"
+    assert interp.conversion == "r"
+    assert interp.format_spec == ">10"
+    assert calls == []
+    assert interp.value == "lazy"
+    assert template.values == ("lazy",)
+    assert calls == [None]
+
+
+def test_lazy_t_nested_format_spec():
+    width = 6
+    assert width
+    template = lazy_t("{undefined_var:>{width}}")
+    assert template.interpolations[0].format_spec == ">6"
+
+
+def test_lazy_t_snapshot():
+    """The caller's locals are captured when lazy_t() is called."""
+    name = "before"
+    template = lazy_t("{name}")
+    name = "after"
+    assert name == "after"
+    assert template.values == ("before",)
+
+
+def test_lazy_t_error_on_access():
+    template = lazy_t("{undefined_var}")
+    with pytest.raises(NameError) as exc_info:
+        template.interpolations[0].value
+    assert "undefined_var" in str(exc_info.value)
+
+
+def test_lazy_t_repr():
+    name = "world"
+    assert name
+    template = lazy_t("Hello, {name}!")
+    assert repr(template.interpolations[0]) == (
+        "Interpolation(value='world', expression='name', conversion=None,"
+        " format_spec='')"
+    )
+
+
+IMPORT_HOOK_MODULE = textwrap.dedent(
+    """
+    \"\"\"A module using t-strings.\"\"\"
+    from __future__ import annotations
+
+    import tstrings
+    from tstrings import t as make_template
+
+
+    def greet(name, source="Bye {name}!", width=8):
+        return make_template("Hello {name!r:>{width}}! {name=}"), make_template(source)
+
+
+    class Greeter:
+        def greet(self, names):
+            return tstrings.t("{[n.upper() for n in names]}")
+    """
+)
+
+
+@pytest.fixture
+def hooked_module(tmp_path, monkeypatch):
+    package = tmp_path / "hooked"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "templates.py").write_text(IMPORT_HOOK_MODULE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(sys, "dont_write_bytecode", False)
+    tstrings.importhook.install("hooked")
+    try:
+        yield importlib.import_module("hooked.templates")
+    finally:
+        tstrings.importhook.uninstall()
+        for name in ("hooked", "hooked.templates"):
+            sys.modules.pop(name, None)
+
+
+def test_import_hook(hooked_module):
+    """t() literals are turned into Template constructions at import time."""
+    precompiled, dynamic = hooked_module.greet("Bob")
+    assert "_tstrings_Template" in hooked_module.greet.__code__.co_names
+
+    assert precompiled.strings == ("Hello ", "! name=", "")
+    assert [i.expression for i in precompiled.interpolations] == ["name", "name"]
+    assert precompiled.values == ("Bob", "Bob")
+    assert [i.conversion for i in precompiled.interpolations] == ["r", "r"]
+    assert precompiled.interpolations[0].format_spec == ">8"
+
+    # Non-literal arguments still go through the runtime t().
+    assert dynamic.strings == ("Bye ", "!")
+    assert dynamic.values == ("Bob",)
+
+    # Unlike with the runtime t(), comprehensions see the enclosing scope.
+    template = hooked_module.Greeter().greet(["a", "b"])
+    assert template.values == (["A", "B"],)
+
+
+def _transformed(source):
+    tree = tstrings.importhook.transform(ast.parse(textwrap.dedent(source)))
+    return ast.unparse(tree)
+
+
+def test_import_hook_shadowed_t():
+    """A `t` bound to anything else in the module is left alone."""
+    source = """
+        from tstrings import t
+        import tstrings
+
+        def render(t, x):
+            return t("{x}")
+
+        def other(x):
+            return tstrings.t("{x}")
+
+        tstrings = None
+    """
+    assert "_tstrings_Template" not in _transformed(source)
+    assert "_tstrings_Template" in _transformed("from tstrings import t\nt('{x}')")
+
+
+def test_import_hook_invalid_field():
+    """Invalid fields are left to the runtime t(), not raised at import."""
+    source = """
+        from tstrings import t
+
+        def never_called(x):
+            return t("{a for a in x}")
+
+        def called(x):
+            return t("{x}")
+    """
+    transformed = _transformed(source)
+    assert "t('{a for a in x}')" in transformed
+    assert "_tstrings_Template(('', ''), (_tstrings_Interpolation(x" in transformed
+
+
+def test_import_hook_bytecode_cache(hooked_module, monkeypatch):
+    cached = importlib.util.cache_from_source(
+        hooked_module.__file__,
+        optimization=f"{tstrings.importhook._CACHE_TAG}o{sys.flags.optimize}",
+    )
+    with open(cached, "rb") as f:
+        assert f.read(4) == importlib.util.MAGIC_NUMBER
+
+    # Loading again uses the cached bytecode, without compiling the source.
+    loader = hooked_module.__loader__
+    monkeypatch.setattr(loader, "source_to_code", None)
+    code = loader.get_code("hooked.templates")
+    assert "_tstrings_Template" in code.co_names
+
+    # Compiled again by another version of tstrings.
+    calls = []
+    monkeypatch.setattr(tstrings.importhook, "_source_digest", lambda: b"other")
+    monkeypatch.setattr(
+        loader, "source_to_code", lambda *args, **kwargs: calls.append(kwargs)
+    )
+    loader.get_code("hooked.templates")
+    assert calls == [{"_optimize": sys.flags.optimize}]
+
+    # Compiled again, and cached separately, at another optimization level.
+    monkeypatch.setattr(tstrings.importhook, "_optimization", lambda: 2)
+    loader.get_code("hooked.templates")
+    assert calls[-1] == {"_optimize": 2}
+    assert os.path.exists(
+        importlib.util.cache_from_source(
+            hooked_module.__file__,
+            optimization=f"{tstrings.importhook._CACHE_TAG}o2",
+        )
+    )
+
+
+def test_render_fstring():
+    name, price, width = "tea", 2.5, 8
+    assert render_fstring(t("{name!r}: {price:>{width}.2f} {{x}}")) == (
+        f"{name!r}: {price:>{width}.2f} {{x}}"
+    )
+    assert render_fstring(t("{name=}")) == f"{name=}"
+    assert render_fstring(t("'\"\\\n")) == "'\"\\\n"
+    assert render_fstring(t("")) == ""
+
+
+def test_render_fstring_other_conversions():
+    values = []
+    formats = [("a", "{^8"), ("r", ""), (None, ">6"), ("a", "}^8"), (None, "")]
+    for conversion, format_spec in formats:
+        template = Template(
+            ("<", ">"), (Interpolation("é", "x", conversion, format_spec),)
+        )
+        values.append(render_fstring(template))
+    assert values == ["<{'\\xe9'{>", "<'é'>", "<     é>", "<}'\\xe9'}>", "<é>"]
+
+
+def test_template_builder():
+    name = "Alice"
+    assert name
+    builder = TemplateBuilder()
+    assert builder.build().strings == ("",)
+    builder.append("<ul>")
+    for _ in range(3):
+        builder.append(t("<li>{name!r}</li>"))
+    builder.append(Interpolation(42, "42", None, ".1f"))
+    builder.append("</ul>")
+    template = builder.build()
+    expected = t("<ul>") + t("<li>{name!r}</li>") + t("<li>{name!r}</li>")
+    expected += t("<li>{name!r}</li>{42:.1f}</ul>")
+    assert_templates_equal(template, expected)
+
+    with pytest.raises(TypeError, match="got 'int'"):
+        builder.append(42)  # type: ignore[arg-type]
+
+
+def test_template_join():
+    name = "Alice"
+    assert name
+    parts = [t("{name}")] * 1000
+    template = Template.join(["[", *parts, "]"])
+    assert template.strings == ("[", *[""] * 999, "]")
+    assert template.values == ("Alice",) * 1000
+    assert_templates_equal(Template.join([]), t(""))
+
+
+GLOBAL_NAME = "global"
+
+
+def test_simple_names_scopes():
+    assert t("{GLOBAL_NAME} {len}").values == ("global", len)
+
+    GLOBAL_NAME = "local"
+    assert GLOBAL_NAME
+    assert t("{GLOBAL_NAME} {len}").values == ("local", len)
+
+    enclosing = "enclosing"
+
+    def inner():
+        assert enclosing
+        return t("{enclosing}")
+
+    assert inner().values == ("enclosing",)
+
+    class Namespace:
+        attribute = "class"
+        template = t("{attribute} {GLOBAL_NAME}")
+
+    assert Namespace.template.values == ("class", "global")
+
+
+def test_simple_names_unbound_local():
+    def function():
+        template = t("{GLOBAL_NAME}")
+        GLOBAL_NAME = "local"
+        assert GLOBAL_NAME
+        return template
+
+    # As with eval(), an unbound local variable falls back to the global one.
+    assert function().values == ("global",)
+
+
+def test_simple_names_error():
+    with pytest.raises(NameError) as exc_info:
+        t("{GLOBAL_NAME} {undefined_name}")
+    assert str(exc_info.value) == (
+        "Failed to evaluate expression 'undefined_name':"
+        " name 'undefined_name' is not defined"
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_render_many(workers):
+    contexts = ({"name": f"user{i}", "price": i / 4} for i in range(100))
+    results = tstrings.batch.render_many(
+        "{name!r}: {price:.2f} {len(name)}", contexts, workers=workers, chunksize=7
+    )
+    assert list(results) == [
+        f"'user{i}': {i / 4:.2f} {len(f'user{i}')}" for i in range(100)
+    ]
+
+
+def test_render_many_errors():
+    with pytest.raises(SyntaxError):
+        tstrings.batch.render_many("{", [])
+    for workers, chunksize in ((0, 64), (2, 0)):
+        with pytest.raises(ValueError, match="must be at least 1"):
+            tstrings.batch.render_many("x", [{}], workers=workers, chunksize=chunksize)
+    results = tstrings.batch.render_many(
+        "{name}", [{"name": 1}, {}], workers=2, chunksize=1
+    )
+    assert next(results) == "1"
+    with pytest.raises(NameError, match="Failed to evaluate expression 'name'"):
+        next(results)
+
+
+@pytest.fixture
+def stats():
+    tstrings.stats.reset()
+    tstrings.stats.enable()
+    yield tstrings.stats
+    tstrings.stats.disable()
+    tstrings.stats.reset()
+
+
+def test_stats(stats):
+    timings = []
+    stats.add_hook(lambda *timing: timings.append(timing))
+    name = "Alice"
+    assert name
+    for _ in range(3):
+        t("Hello {name}")
+    t("static")
+    stats.disable()
+    t("Hello {name}!")
+
+    snapshot = stats.snapshot()
+    assert list(snapshot) == ["Hello {name}", "static"]
+    assert list(snapshot["Hello {name}"]) == ["parse", "evaluate"]
+    evaluate = snapshot["Hello {name}"]["evaluate"]
+    assert evaluate["count"] == 3
+    assert 0 < evaluate["p50"] <= evaluate["p99"] <= evaluate["max"]
+    assert evaluate["total"] == pytest.approx(evaluate["mean"] * 3)
+    assert [timing[:2] for timing in timings[:2]] == [
+        ("Hello {name}", "parse"),
+        ("Hello {name}", "evaluate"),
+    ]
+    assert len(timings) == 8
+
+
+def test_stats_max_templates(stats):
+    stats.enable(max_templates=2)
+    for text in ("a", "b", "a", "c"):
+        t(text)
+    assert list(stats.snapshot()) == ["a", "c"]
+    assert stats.evictions() == 1
+    output = io.StringIO()
+    stats.report(file=output)
+    assert output.getvalue().endswith("(1 templates evicted, see enable())\n")
+    stats.reset()
+    assert stats.evictions() == 0
+
+
+def test_stats_main(stats, tmp_path, monkeypatch, capsys):
+    script = tmp_path / "script.py"
+    script.write_text(
+        "import sys\nfrom tstrings import t\n"
+        "for arg in sys.argv[1:]:\n    t('<p>{arg}</p>')\n"
+    )
+    monkeypatch.setattr(sys, "argv", ["stats", "-n", "1", str(script), "a", "b"])
+    stats.main()
+    report = capsys.readouterr().out.splitlines()
+    assert report[1] == "<p>{arg}</p>"
+    assert report[2].split()[:2] == ["parse", "2"]
+    assert report[3].split()[:2] == ["evaluate", "2"]
+    assert not stats.enabled()